@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CommunityConfig(AppConfig):
     name = 'community'
+
+    def ready(self):
+        # Branche les signaux (compteurs, versions des fragments, dérivés des images)
+        from . import signals  # noqa: F401
@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import Counter, defaultdict
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from .models import Comment, Post, Reaction
+
+# -----------------------------
+# Compteurs d'engagement des posts
+# - comment_count : incrément atomique F() à chaque création/suppression (signals.py)
+# - view_count, reaction_count : accumulés dans la mémoire du processus puis
+#   écrits en une seule requête UPDATE ... CASE par lot, pour qu'un post très
+#   consulté ne verrouille pas sa ligne à chaque affichage.
+#   reaction_count est recompté depuis Reaction à l'écriture (le lot ne sert qu'à
+#   savoir quels posts recompter) : chaque processus ayant son propre lot, des
+#   deltas appliqués après une correction la feraient dériver à nouveau.
+# Le lot est écrit quand il atteint FLUSH_THRESHOLD, ou en fin de requête
+# (request_finished, voir signals.py) une fois FLUSH_INTERVAL écoulé. Pas
+# d'écriture à l'arrêt du processus (la base peut déjà ne plus être là, ex.
+# tests) : au plus FLUSH_INTERVAL secondes de vues sont perdues.
+# Les valeurs exactes se recalculent avec la commande reconcile_post_counters.
+# -----------------------------
+BUFFERED_FIELDS = ('view_count', 'reaction_count')
+# Compteurs recomptés depuis leur table source à l'écriture du lot
+RECOUNTED_FIELDS = {'reaction_count': Reaction}
+FLUSH_THRESHOLD = 200   # incréments en attente
+FLUSH_INTERVAL = 10     # secondes
+
+_pending = Counter()
+_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def increment_comment_count(post_id, delta):
+    # Greatest : un compteur dérivé ne passe jamais sous zéro (colonne positive)
+    Post.objects.filter(pk=post_id).update(comment_count=Greatest(F('comment_count') + delta, 0))
+
+
+def buffer_increment(post_id, field, delta=1):
+    """Ajoute `delta` au compteur en attente ; écrit le lot si le seuil est atteint."""
+    if field not in BUFFERED_FIELDS:
+        raise ValueError(f"Compteur inconnu : {field}")
+    with _lock:
+        _pending[(post_id, field)] += delta
+        due = len(_pending) >= FLUSH_THRESHOLD
+    if due:
+        flush_counters()
+
+
+def flush_counters_if_due(**kwargs):
+    """Fin de requête (request_finished) : écrit le lot en attente si l'intervalle est écoulé."""
+    with _lock:
+        due = bool(_pending) and time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        flush_counters()
+
+
+def discard_pending():
+    # Tests : le lot est global au processus, il ne doit pas passer d'un test à l'autre
+    with _lock:
+        _pending.clear()
+
+
+def flush_counters():
+    """Écrit les incréments en attente en une requête ; retourne le nombre de posts touchés."""
+    global _last_flush
+    with _lock:
+        pending = {key: delta for key, delta in _pending.items() if delta}
+        _pending.clear()
+        _last_flush = time.monotonic()
+    if not pending:
+        return 0
+
+    by_field = defaultdict(dict)
+    for (post_id, field), delta in pending.items():
+        by_field[field][post_id] = delta
+    updates = {}
+    for field, deltas in by_field.items():
+        if field in RECOUNTED_FIELDS:
+            updates[field] = Case(
+                When(pk__in=list(deltas), then=exact_count(RECOUNTED_FIELDS[field])),
+                default=F(field),
+                output_field=Post._meta.get_field(field),
+            )
+        else:
+            updates[field] = Greatest(
+                F(field) + Case(*[When(pk=post_id, then=Value(delta)) for post_id, delta in deltas.items()], default=Value(0)),
+                0,
+            )
+    post_ids = {post_id for post_id, _ in pending}
+    Post.objects.filter(pk__in=post_ids).update(**updates)
+    return len(post_ids)
+
+
+def exact_count(model):
+    """Nombre de lignes de `model` du post courant (sous-requête corrélée)."""
+    rows = model.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(rows), 0)
+
+
+def exact_counts(posts):
+    """Annote exact_comments et exact_reactions."""
+    return posts.annotate(exact_comments=exact_count(Comment), exact_reactions=exact_count(Reaction))
+
+
+def reconcile_counters(fix=False, batch_size=500):
+    """
+    Compare comment_count et reaction_count aux valeurs recalculées.
+    Retourne la liste des posts en écart (corrigés si fix=True).
+    view_count n'a pas de source de vérité : seul le lot en attente est écrit.
+    Les lots des autres processus (workers web) ne faussent pas la correction :
+    reaction_count y est recompté à l'écriture.
+    """
+    flush_counters()
+    drifted = [
+        post for post in exact_counts(Post.objects.only('pk', 'title', 'comment_count', 'reaction_count')).iterator(chunk_size=2000)
+        if (post.comment_count, post.reaction_count) != (post.exact_comments, post.exact_reactions)
+    ]
+    if fix and drifted:
+        for post in drifted:
+            post.stored_counts = (post.comment_count, post.reaction_count)
+            post.comment_count, post.reaction_count = post.exact_comments, post.exact_reactions
+        Post.objects.bulk_update(drifted, ['comment_count', 'reaction_count'], batch_size=batch_size)
+    return drifted
@@ -0,0 +1,108 @@
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+
+# -----------------------------
+# Dérivés des images des posts (calcul)
+# Chaque image est redimensionnée en trois largeurs et réencodée en JPEG
+# progressif et en WebP, sans métadonnées EXIF (position GPS, appareil...).
+# L'original est lui aussi réencodé sans métadonnées (même taille ; même
+# format sauf s'il n'est pas reconnu, voir ORIGINAL_ENCODINGS).
+# Le décodage et l'encodage, purement CPU, tournent dans un pool de
+# processus ; ce module n'importe pas Django pour que les processus démarrent
+# vite (écriture des fichiers : voir images.py).
+# -----------------------------
+
+DERIVATIVE_WIDTHS = {'thumb': 320, 'feed': 720, 'full': 1600}
+# format -> (format Pillow, extension, options d'encodage)
+ENCODINGS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+}
+# Formats d'origine réencodés sans métadonnées : format Pillow -> options d'encodage
+ORIGINAL_ENCODINGS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 90},
+}
+# Variantes d'un même format : la plupart des photos de téléphone s'ouvrent en MPO
+ORIGINAL_FAMILIES = {'MPO': 'JPEG'}
+# Formats gardés tels quels (GIF animé : pas de bloc EXIF)
+KEPT_ORIGINALS = {'GIF'}
+# Tout autre format (TIFF, HEIF...) est réencodé sans perte dans celui-ci
+FALLBACK_ORIGINAL = ('PNG', 'png')
+POOL_WORKERS = 2
+
+
+# --- Exécuté dans les processus du pool (Pillow seulement, pas de Django) ---
+def render_derivatives(data):
+    """{taille: {'width', 'height', format: octets}} pour une image source (octets)."""
+    return render_post_image(data)['derivatives']
+
+
+def render_post_image(data):
+    """
+    {'original': octets sans métadonnées (None si format gardé tel quel),
+     'original_extension': nouvelle extension si le format a changé (sinon None),
+     'derivatives': {taille: {'width', 'height', format: octets}}}.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        # Orientation appliquée aux pixels avant de perdre l'EXIF qui la décrit
+        image = ImageOps.exif_transpose(source)
+        original, original_extension = _clean_original(image, source.format)
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            # JPEG sans transparence : fond blanc
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image.convert('RGBA'), mask=image.convert('RGBA').getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+
+    derivatives = {}
+    for size, width in DERIVATIVE_WIDTHS.items():
+        resized = image.copy()
+        if resized.width > width:
+            # Jamais d'agrandissement : une petite image garde sa taille
+            resized.thumbnail((width, resized.height), Image.Resampling.LANCZOS)
+        derivative = {'width': resized.width, 'height': resized.height}
+        for fmt, (pillow_format, _, options) in ENCODINGS.items():
+            output = io.BytesIO()
+            # Aucun exif= ni icc_profile= transmis : le fichier produit n'a pas de métadonnées
+            resized.save(output, pillow_format, **options)
+            derivative[fmt] = output.getvalue()
+        derivatives[size] = derivative
+    return {'original': original, 'original_extension': original_extension, 'derivatives': derivatives}
+
+
+def _clean_original(image, pillow_format):
+    """(octets, extension) : extension None si le fichier garde son format."""
+    if pillow_format in KEPT_ORIGINALS:
+        return None, None
+    pillow_format = ORIGINAL_FAMILIES.get(pillow_format, pillow_format)
+    extension = None
+    if pillow_format not in ORIGINAL_ENCODINGS:
+        pillow_format, extension = FALLBACK_ORIGINAL
+    if pillow_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    output = io.BytesIO()
+    image.save(output, pillow_format, **ORIGINAL_ENCODINGS[pillow_format])
+    return output.getvalue(), extension
+
+
+# --- Pool de processus ---
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        # spawn : pas de copie des connexions ni des verrous du processus web
+        _executor = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+def reset_executor():
+    # Pool cassé (processus tué) : un nouveau sera créé au prochain appel
+    global _executor
+    _executor = None
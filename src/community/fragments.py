@@ -0,0 +1,129 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+# -----------------------------
+# Cache de fragments HTML de la communauté
+# Chaque post a un numéro de version (cache persistant, sans expiration) changé par les
+# signaux de Post et de Comment ; la clé d'un fragment contient cette version,
+# donc un fragment modifié n'est jamais invalidé explicitement : il n'est
+# simplement plus lu. Les fragments ne contiennent rien de propre à
+# l'utilisateur (boutons, jeton CSRF, compteurs) : ces parties sont rendues
+# à chaque requête autour du HTML mis en cache.
+# Uniquement get_many/set_many/incr : fonctionne avec locmem, fichiers, Redis...
+# -----------------------------
+FRAGMENT_TIMEOUT = 60 * 5  # Borne aussi la dérive des "il y a 3 minutes"
+STATS_KEY = 'community:fragments:{}'
+STATS_FLUSH_EVERY = 100    # Lectures avant report des compteurs dans le cache partagé
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def version_key(post_id):
+    return f'community:post:{post_id}:version'
+
+
+def persistent_cache():
+    # Versions et statistiques : jamais purgées avec les fragments
+    return caches[settings.PERSISTENT_CACHE_ALIAS]
+
+
+def bump_post_version(post_id):
+    persistent_cache().set(version_key(post_id), time.time_ns(), None)
+
+
+def post_versions(post_ids):
+    """{post_id: version} en une lecture ; les versions absentes sont créées."""
+    keys = {post_id: version_key(post_id) for post_id in post_ids}
+    found = persistent_cache().get_many(keys.values())
+    versions, missing = {}, {}
+    for post_id, key in keys.items():
+        if key in found:
+            versions[post_id] = found[key]
+        else:
+            versions[post_id] = missing[key] = time.time_ns()
+    if missing:
+        persistent_cache().set_many(missing, None)
+    return versions
+
+
+def fragment_key(name, post_id, version, variant=''):
+    # Langue active dans la clé : {% trans %} et les dates sont rendus dans le fragment
+    if variant:
+        variant = hashlib.sha1(variant.encode()).hexdigest()[:16]
+    return f'community:fragment:{name}:{get_language()}:{post_id}:{version}:{variant}'
+
+
+def cached_fragments(name, posts, render, variant=''):
+    """
+    {post.pk: html} pour une liste de posts : deux lectures de cache (versions
+    puis fragments), `render(post)` appelé seulement pour les fragments absents.
+    """
+    versions = post_versions([post.pk for post in posts])
+    keys = {post.pk: fragment_key(name, post.pk, versions[post.pk], variant) for post in posts}
+    found = cache.get_many(keys.values())
+
+    fragments, rendered = {}, {}
+    for post in posts:
+        key = keys[post.pk]
+        if key in found:
+            fragments[post.pk] = found[key]
+        else:
+            fragments[post.pk] = rendered[key] = str(render(post))
+    if rendered:
+        cache.set_many(rendered, FRAGMENT_TIMEOUT)
+
+    record_lookups(hits=len(posts) - len(rendered), misses=len(rendered))
+    return {post_id: mark_safe(html) for post_id, html in fragments.items()}
+
+
+def cached_fragment(name, post, render, variant=''):
+    return cached_fragments(name, [post], render, variant)[post.pk]
+
+
+# --- Taux de réussite ---
+def record_lookups(hits, misses):
+    with _stats_lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+        due = _stats['hits'] + _stats['misses'] >= STATS_FLUSH_EVERY
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """Reporte les compteurs du processus dans le cache partagé (tous processus confondus)."""
+    with _stats_lock:
+        pending = dict(_stats)
+        _stats.clear()
+    for name, value in pending.items():
+        if not value:
+            continue
+        key = STATS_KEY.format(name)
+        stats = persistent_cache()
+        if not stats.add(key, value, None):
+            try:
+                stats.incr(key, value)
+            except ValueError:  # Clé supprimée entre add() et incr()
+                stats.set(key, value, None)
+
+
+def fragment_stats():
+    flush_stats()
+    stats = persistent_cache()
+    hits = stats.get(STATS_KEY.format('hits'), 0)
+    misses = stats.get(STATS_KEY.format('misses'), 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+
+
+def reset_fragment_stats():
+    with _stats_lock:
+        _stats.clear()
+    persistent_cache().delete_many([STATS_KEY.format('hits'), STATS_KEY.format('misses')])
@@ -0,0 +1,122 @@
+import logging
+import posixpath
+import threading
+from concurrent.futures import BrokenExecutor
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from .derivatives import DERIVATIVE_WIDTHS, ENCODINGS, get_executor, render_post_image, reset_executor
+from .fragments import bump_post_version
+from .models import Post
+
+# -----------------------------
+# Images des posts : l'original téléversé (souvent une photo de téléphone de
+# plusieurs Mo) n'est plus servi. Les dérivés calculés dans le pool
+# (derivatives.py) sont écrits par le processus Django via le stockage par
+# défaut, quel qu'il soit, puis décrits dans Post.image_variants. L'original
+# est remplacé par sa version sans métadonnées (position GPS...) ; tant que
+# ce n'est pas fait, les templates n'affichent pas l'image.
+# -----------------------------
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'community/posts/derivatives'
+
+
+def derivative_name(post_id, source_name, size, fmt):
+    stem = posixpath.splitext(posixpath.basename(source_name))[0]
+    return f"{DERIVATIVES_DIR}/{post_id}/{stem}-{size}.{ENCODINGS[fmt][1]}"
+
+
+def store_derivatives(post_id, source_name, derivatives, original=None, original_extension=None):
+    """
+    Écrit les fichiers et enregistre Post.image_variants, sauf si l'image du
+    post a changé entre-temps (un nouveau calcul est alors déjà prévu).
+    `original` (octets sans métadonnées) remplace le fichier téléversé,
+    renommé avec `original_extension` si son format a changé.
+    Les dérivés de l'image précédente sont supprimés une fois les nouveaux en place.
+    """
+    variants = {'source': source_name}
+    for size, derivative in derivatives.items():
+        variants[size] = {'width': derivative['width'], 'height': derivative['height']}
+        for fmt in ENCODINGS:
+            name = derivative_name(post_id, source_name, size, fmt)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[size][fmt] = default_storage.save(name, ContentFile(derivative[fmt]))
+
+    with transaction.atomic():
+        # Dérivés actuels lus sous verrou, avant d'être remplacés
+        previous = Post.objects.select_for_update().filter(pk=post_id, image=source_name).values_list(
+            'image_variants', flat=True
+        ).first()
+        if previous is not None:
+            if original is not None:
+                default_storage.delete(source_name)
+                name = source_name
+                if original_extension:
+                    name = f"{posixpath.splitext(source_name)[0]}.{original_extension}"
+                variants['source'] = default_storage.save(name, ContentFile(original))
+            Post.objects.filter(pk=post_id).update(image=variants['source'], image_variants=variants)
+
+    if previous is None:
+        delete_derivatives(variants)
+        return variants
+    bump_post_version(post_id)  # Les fragments en cache n'affichent pas encore l'image
+    delete_derivatives(previous, keep=variants)
+    return variants
+
+
+def variant_names(variants):
+    return {
+        (variants.get(size) or {}).get(fmt)
+        for size in DERIVATIVE_WIDTHS for fmt in ENCODINGS
+    } - {None}
+
+
+def delete_derivatives(variants, keep=None):
+    # `keep` : dérivés à conserver (même nom quand la même image est recalculée)
+    for name in variant_names(variants) - variant_names(keep or {}):
+        default_storage.delete(name)
+
+
+def read_source(post):
+    with post.image.open('rb') as source:
+        return source.read()
+
+
+def schedule_post_derivatives(post):
+    """
+    Calcul en arrière-plan ; les fichiers sont écrits quand le pool a terminé.
+    Appelé après validation de la transaction du post : un échec est journalisé
+    sans faire échouer la requête (build_post_images rattrape les oublis).
+    """
+    post_id, source_name = post.pk, post.image.name
+    caller = threading.get_ident()
+    try:
+        future = get_executor().submit(render_post_image, read_source(post))
+    except BrokenExecutor:
+        reset_executor()
+        logger.exception("Pool de calcul des images indisponible : dérivés du post %s non générés", post_id)
+        return None
+    except Exception:
+        logger.exception("Image du post %s illisible : dérivés non générés", post_id)
+        return None
+
+    def done(future):
+        # Exécuté dans un thread du pool : connexion propre à ce thread, fermée ensuite
+        try:
+            result = future.result()
+            store_derivatives(
+                post_id, source_name, result['derivatives'], result['original'], result['original_extension']
+            )
+        except BrokenExecutor:
+            reset_executor()
+            logger.exception("Pool de calcul des images interrompu : dérivés du post %s non générés", post_id)
+        except Exception:
+            logger.exception("Dérivés de l'image du post %s non générés", post_id)
+        finally:
+            if threading.get_ident() != caller:
+                connection.close()
+
+    future.add_done_callback(done)
+    return future
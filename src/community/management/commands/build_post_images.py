@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from community.derivatives import get_executor, render_post_image
+from community.images import read_source, store_derivatives
+from community.models import Post
+
+
+class Command(BaseCommand):
+    help = "Génère les dérivés (tailles, JPEG/WebP, sans EXIF) des images de posts existantes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Régénère aussi les images qui ont déjà leurs dérivés.")
+        parser.add_argument('--batch-size', type=int, default=20, help="Images envoyées au pool à la fois.")
+
+    def handle(self, *args, **options):
+        posts = [
+            post for post in Post.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_variants')
+            if options['all'] or not post.has_image_variants()
+        ]
+        executor = get_executor()
+        done = failed = 0
+        for start in range(0, len(posts), options['batch_size']):
+            batch = posts[start:start + options['batch_size']]
+            # Lot calculé en parallèle ; fichiers écrits ici, au fil des résultats
+            futures = []
+            for post in batch:
+                try:
+                    futures.append((post, executor.submit(render_post_image, read_source(post))))
+                except OSError as e:
+                    self.stderr.write(f"Post {post.pk} : {e}")
+                    failed += 1
+            for post, future in futures:
+                try:
+                    result = future.result()
+                    store_derivatives(
+                        post.pk, post.image.name, result['derivatives'], result['original'], result['original_extension']
+                    )
+                    done += 1
+                except Exception as e:
+                    self.stderr.write(f"Post {post.pk} : {e}")
+                    failed += 1
+            self.stdout.write(f"{done + failed}/{len(posts)} image(s) traitée(s)...")
+
+        self.stdout.write(self.style.SUCCESS(f"{done} image(s) traitée(s), {failed} échec(s)."))
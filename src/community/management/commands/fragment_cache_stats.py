@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from community.fragments import fragment_stats, reset_fragment_stats
+
+
+class Command(BaseCommand):
+    help = "Affiche le taux de réussite du cache de fragments de la communauté."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help="Remet les compteurs à zéro après affichage.")
+
+    def handle(self, *args, **options):
+        stats = fragment_stats()
+        rate = f"{stats['hit_rate']:.1%}" if stats['hit_rate'] is not None else "-"
+        self.stdout.write(f"Succès : {stats['hits']}  Échecs : {stats['misses']}  Taux : {rate}")
+        if options['reset']:
+            reset_fragment_stats()
+            self.stdout.write(self.style.WARNING("Compteurs remis à zéro."))
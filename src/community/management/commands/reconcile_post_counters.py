@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from community.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = "Recalcule les compteurs de commentaires et de réactions des posts et signale les écarts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Remplace les compteurs en écart par les valeurs exactes.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        drifted = reconcile_counters(fix=options['fix'], batch_size=options['batch_size'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Compteurs cohérents avec les données."))
+            return
+
+        for post in drifted[:20]:
+            comments, reactions = getattr(post, 'stored_counts', (post.comment_count, post.reaction_count))
+            self.stdout.write(
+                f"{post.pk} {post.title!r} : commentaires {comments} -> {post.exact_comments}, "
+                f"réactions {reactions} -> {post.exact_reactions}"
+            )
+        if options['fix']:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} post(s) corrigé(s)."))
+        else:
+            raise CommandError(f"{len(drifted)} post(s) en écart.")
@@ -0,0 +1,42 @@
+# Generated by Django 6.0 on 2026-10-18 12:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_root(apps, schema_editor):
+    # Racine de chaque réponse existante, en remontant les parents en mémoire
+    Comment = apps.get_model('community', 'Comment')
+    comments = Comment.objects.using(schema_editor.connection.alias)
+    parents = dict(comments.values_list('id', 'parent_id'))
+    replies = []
+    for comment_id, parent_id in parents.items():
+        if parent_id is None:
+            continue
+        root_id = parent_id
+        while parents.get(root_id):
+            root_id = parents[root_id]
+        replies.append(Comment(id=comment_id, root_id=root_id))
+    comments.bulk_update(replies, ['root'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0005_post_feed_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='descendants', to='community.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'root', '-created_at', '-id'], name='comment_thread_idx'),
+        ),
+        migrations.RunPython(fill_root, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.core.files.storage import default_storage
 from django.utils.translation import gettext_lazy as _
+from .derivatives import DERIVATIVE_WIDTHS
 
 class Post(models.Model):
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -12,8 +14,62 @@ class Post(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_pinned = models.BooleanField(default=False)
 
+    # Compteurs dénormalisés (voir counters.py) : commentaires mis à jour par signaux,
+    # vues et réactions accumulées en mémoire puis écrites par lots
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    reaction_count = models.PositiveIntegerField(default=0, editable=False)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    # Dérivés redimensionnés de l'image (voir images.py) :
+    # {'source': nom de l'original, 'thumb'|'feed'|'full': {'width', 'height', 'jpeg', 'webp'}}
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Colonnes écrites en arrière-plan par des UPDATE ciblés
+    COUNTER_FIELDS = ('comment_count', 'reaction_count', 'view_count')
+    BACKGROUND_FIELDS = COUNTER_FIELDS + ('image_variants',)
+
     def __str__(self):
         return self.title
+
+    def save(self, *args, **kwargs):
+        # Compteurs et dérivés s'écrivent en arrière-plan : un save() complet
+        # d'un post existant ne doit pas écraser des valeurs plus récentes
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.BACKGROUND_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    # --- Image : uniquement les dérivés (l'original peut encore contenir l'EXIF) ---
+    def has_image_variants(self):
+        return bool(self.image) and self.image_variants.get('source') == self.image.name
+
+    def image_srcset(self, fmt='jpeg'):
+        if not self.has_image_variants():
+            return ''
+        variants = [self.image_variants[size] for size in DERIVATIVE_WIDTHS if size in self.image_variants]
+        return ', '.join(f"{default_storage.url(variant[fmt])} {variant['width']}w" for variant in variants)
+
+    @property
+    def image_srcset_jpeg(self):
+        return self.image_srcset('jpeg')
+
+    @property
+    def image_srcset_webp(self):
+        return self.image_srcset('webp')
+
+    def image_src(self, size='feed'):
+        if self.has_image_variants():
+            return default_storage.url(self.image_variants[size]['jpeg'])
+        return ''
+
+    @property
+    def feed_image_url(self):
+        return self.image_src('feed')
+
+    @property
+    def full_image_url(self):
+        return self.image_src('full')
     
     def get_youtube_id(self):
         if self.video_url and 'youtube.com' in self.video_url:
@@ -26,16 +82,43 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-is_pinned', '-created_at']
+        indexes = [
+            # Fil d'actualité paginé par curseur sur (épinglé, date, id)
+            models.Index(fields=['-is_pinned', '-created_at', '-id'], name='post_feed_idx'),
+        ]
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     content = models.TextField()
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Commentaire de premier niveau du fil (None pour lui-même) : toutes les réponses
+    # d'un fil, quelle que soit leur profondeur, se lisent en une requête
+    root = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='descendants', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Commentaires de premier niveau d'un post (root IS NULL), paginés par curseur
+            models.Index(fields=['post', 'root', '-created_at', '-id'], name='comment_thread_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.parent_id and not self.root_id:
+            self.root_id = self.parent.root_id or self.parent_id
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Commentaire de {self.user.username} sur {self.post.title}"
+
+class Reaction(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='reactions')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['post', 'user']
 
     def __str__(self):
-        return f"Commentaire de {self.user.username} sur {self.post.title}"
\ No newline at end of file
+        return f"Réaction de {self.user} sur {self.post.title}"
@@ -0,0 +1,56 @@
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .counters import flush_counters_if_due, increment_comment_count
+from .fragments import bump_post_version
+from .images import delete_derivatives, schedule_post_derivatives
+from .models import Comment, Post
+
+
+# --- Compteur de commentaires des posts (incrément atomique, pas de COUNT à la lecture) ---
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        increment_comment_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    # Les réponses supprimées en cascade passent aussi par ici
+    increment_comment_count(instance.post_id, -1)
+
+
+# --- Lot des compteurs de vues / réactions : écrit en fin de requête ---
+request_finished.connect(flush_counters_if_due, dispatch_uid='community_flush_counters')
+
+
+# --- Version des fragments HTML du post (carte du fil, article, discussion) ---
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_fragments(sender, instance, **kwargs):
+    bump_post_version(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_thread_fragments(sender, instance, **kwargs):
+    bump_post_version(instance.post_id)
+
+
+# --- Dérivés de l'image : calculés après validation de la transaction ---
+@receiver(post_save, sender=Post)
+def schedule_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image and not instance.has_image_variants():
+        transaction.on_commit(lambda: schedule_post_derivatives(instance))
+    elif not instance.image and instance.image_variants:
+        delete_derivatives(instance.image_variants)
+        Post.objects.filter(pk=instance.pk).update(image_variants={})
+
+
+@receiver(post_delete, sender=Post)
+def delete_image_derivatives(sender, instance, **kwargs):
+    if instance.image_variants:
+        transaction.on_commit(lambda: delete_derivatives(instance.image_variants))
@@ -1,3 +1,247 @@
-from django.test import TestCase
+import io
+import tempfile
+from PIL import Image
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from patients.models import PatientProfile
+from users.models import CustomUser
+from .models import Comment, Post, Reaction
+from .counters import buffer_increment, discard_pending, flush_counters, reconcile_counters
+from .derivatives import DERIVATIVE_WIDTHS, render_derivatives, render_post_image
+from .images import store_derivatives, variant_names
+from .fragments import cached_fragment, fragment_stats, reset_fragment_stats
+from .threads import THREAD_ORDERING, comment_thread
+from .views import FEED_ORDERING, FEED_PAGE_SIZE
 
-# Create your tests here.
+
+class FeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create(email='dietitian@example.com', role='dietitian')
+        cls.posts = [
+            Post.objects.create(author=cls.author, title=f'Post {i}', content='-', is_pinned=(i == 0))
+            for i in range(3)
+        ]
+        Comment.objects.create(post=cls.posts[1], user=cls.author, content='-')
+        Comment.objects.create(post=cls.posts[1], user=cls.author, content='-')
+
+    def setUp(self):
+        discard_pending()
+        self.addCleanup(discard_pending)
+
+    def test_comment_count(self):
+        counts = dict(Post.objects.values_list('pk', 'comment_count'))
+        self.assertEqual(counts, {self.posts[0].pk: 0, self.posts[1].pk: 2, self.posts[2].pk: 0})
+        Comment.objects.filter(post=self.posts[1]).first().delete()
+        self.assertEqual(Post.objects.get(pk=self.posts[1].pk).comment_count, 1)
+
+    def test_buffered_counters(self):
+        buffer_increment(self.posts[0].pk, 'view_count', 3)
+        buffer_increment(self.posts[2].pk, 'view_count')
+        buffer_increment(self.posts[2].pk, 'reaction_count', -1)
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_counters(), 2)
+        values = dict((pk, (views, reactions)) for pk, views, reactions in Post.objects.values_list('pk', 'view_count', 'reaction_count'))
+        self.assertEqual(values[self.posts[0].pk], (3, 0))
+        self.assertEqual(values[self.posts[2].pk], (1, 0))
+
+    def test_reaction_count_recounted_at_flush(self):
+        Reaction.objects.create(post=self.posts[0], user=self.author)
+        # Deltas faussés (lot d'un autre processus après une correction) : le total reste exact
+        buffer_increment(self.posts[0].pk, 'reaction_count', 5)
+        flush_counters()
+        self.assertEqual(Post.objects.get(pk=self.posts[0].pk).reaction_count, 1)
+
+    def test_reconcile(self):
+        Post.objects.filter(pk=self.posts[1].pk).update(comment_count=7)
+        self.assertEqual([post.pk for post in reconcile_counters(fix=True)], [self.posts[1].pk])
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_feed_page_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Vérification du plan écrite pour SQLite.")
+        plan = Post.objects.order_by(*FEED_ORDERING)[:FEED_PAGE_SIZE + 1].explain()
+        self.assertIn('post_feed_idx', plan)
+        self.assertNotIn('USE TEMP B-TREE', plan)
+
+
+class ThreadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(email='dietitian@example.com', role='dietitian')
+        cls.post = Post.objects.create(author=cls.user, title='Post', content='-')
+        cls.top = Comment.objects.create(post=cls.post, user=cls.user, content='top')
+        cls.reply = Comment.objects.create(post=cls.post, user=cls.user, content='reply', parent=cls.top)
+        cls.nested = Comment.objects.create(post=cls.post, user=cls.user, content='nested', parent=cls.reply)
+
+    def test_root_is_set_at_any_depth(self):
+        self.assertIsNone(self.top.root_id)
+        self.assertEqual(self.reply.root_id, self.top.pk)
+        self.assertEqual(self.nested.root_id, self.top.pk)
+
+    def test_thread_in_two_queries(self):
+        # Page de premier niveau + toutes les réponses, auteurs joints
+        with self.assertNumQueries(2):
+            page = comment_thread(self.post)
+            top = page.object_list[0]
+            self.assertEqual([c.content for c in top.children], ['reply'])
+            self.assertEqual([c.content for c in top.children[0].children], ['nested'])
+            self.assertEqual(top.children[0].children[0].user.email, 'dietitian@example.com')
+
+    def test_top_level_page_uses_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("Vérification du plan écrite pour SQLite.")
+        top_level = Comment.objects.filter(post=self.post, root__isnull=True).order_by(*THREAD_ORDERING)[:21]
+        plan = top_level.explain()
+        self.assertIn('comment_thread_idx', plan)
+        self.assertNotIn('USE TEMP B-TREE', plan)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fragments-tests'},
+    'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fragments-tests-sessions'},
+    'persistent': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fragments-tests-persistent'},
+})
+class FragmentCacheTests(TestCase):
+
+    def setUp(self):
+        # Les identifiants de posts sont réutilisés d'un test à l'autre
+        cache.clear()
+        caches['persistent'].clear()
+        discard_pending()
+        self.addCleanup(discard_pending)
+        self.user = CustomUser.objects.create(email='dietitian@example.com', role='dietitian')
+        self.post = Post.objects.create(author=self.user, title='Post', content='-')
+        self.renders = 0
+        reset_fragment_stats()
+
+    def render(self, post):
+        self.renders += 1
+        return f'<h1>{post.title}</h1>'
+
+    def test_fragment_reused_until_version_changes(self):
+        self.assertEqual(cached_fragment('card', self.post, self.render), '<h1>Post</h1>')
+        cached_fragment('card', self.post, self.render)
+        self.assertEqual(self.renders, 1)
+
+        Comment.objects.create(post=self.post, user=self.user, content='-')  # Nouvelle version
+        self.post.title = 'Modifié'
+        self.assertEqual(cached_fragment('card', self.post, self.render), '<h1>Modifié</h1>')
+        self.assertEqual(self.renders, 2)
+
+        stats = fragment_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+    def test_thread_cache_keyed_on_returned_page(self):
+        Comment.objects.create(post=self.post, user=self.user, content='-')
+        self.client.force_login(self.user)
+        url = reverse('post_detail', args=[self.post.pk])
+        for cursor in ('', 'invalide', 'eyJkIjoibiIsImsiOltdfQ', 'autre-jeton'):
+            self.client.get(url, {'cursor': cursor})
+        # Article + fil rendus une fois : les jetons invalides mènent à la même page
+        self.assertEqual(fragment_stats()['misses'], 2)
+
+    def test_delete_buttons_only_for_own_comments(self):
+        patient = CustomUser.objects.create(email='patient@example.com', role='patient')
+        PatientProfile.objects.filter(user=patient).update(age=30)
+        own = Comment.objects.create(post=self.post, user=patient, content='-')
+        other = Comment.objects.create(post=self.post, user=self.user, content='-')
+        url = reverse('post_detail', args=[self.post.pk])
+
+        self.client.force_login(self.user)
+        html = self.client.get(url).content.decode()
+        self.assertIn(reverse('delete_comment', args=[own.pk]), html)
+
+        # Même fragment en cache, boutons propres à l'utilisateur
+        self.client.force_login(patient)
+        html = self.client.get(url).content.decode()
+        self.assertIn(reverse('delete_comment', args=[own.pk]), html)
+        self.assertNotIn(reverse('delete_comment', args=[other.pk]), html)
+
+
+class DerivativeTests(TestCase):
+
+    def test_resized_reencoded_without_exif(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation : rotation de 90°
+        exif[0x010F] = 'Téléphone'
+        source = io.BytesIO()
+        Image.new('RGB', (2400, 1200), 'red').save(source, 'JPEG', exif=exif.tobytes())
+
+        derivatives = render_derivatives(source.getvalue())
+        self.assertEqual(set(derivatives), set(DERIVATIVE_WIDTHS))
+        for size, width in DERIVATIVE_WIDTHS.items():
+            derivative = derivatives[size]
+            for fmt in ('jpeg', 'webp'):
+                image = Image.open(io.BytesIO(derivative[fmt]))
+                self.assertEqual(dict(image.getexif()), {})
+                # Orientation appliquée (portrait), jamais agrandie
+                self.assertEqual(image.size, (min(width, 1200), min(width, 1200) * 2))
+
+    def test_phone_and_unknown_formats_stripped(self):
+        exif = Image.Exif()
+        exif[0x8825] = {0x0002: (48.0, 51.0, 24.0)}  # GPS : latitude
+        frame = Image.new('RGB', (800, 400), 'red')
+
+        # Photo de téléphone ouverte en MPO par Pillow : réencodée en JPEG, même extension
+        mpo = io.BytesIO()
+        frame.save(mpo, 'MPO', exif=exif.tobytes(), save_all=True, append_images=[frame])
+        self.assertEqual(Image.open(mpo).format, 'MPO')
+        result = render_post_image(mpo.getvalue())
+        original = Image.open(io.BytesIO(result['original']))
+        self.assertEqual((original.format, dict(original.getexif())), ('JPEG', {}))
+        self.assertIsNone(result['original_extension'])
+
+        # Format non prévu : réencodé sans perte, l'extension change
+        tiff = io.BytesIO()
+        frame.save(tiff, 'TIFF', exif=exif.tobytes())
+        result = render_post_image(tiff.getvalue())
+        original = Image.open(io.BytesIO(result['original']))
+        self.assertEqual((original.format, dict(original.getexif())), ('PNG', {}))
+        self.assertEqual(result['original_extension'], 'png')
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            author = CustomUser.objects.create(email='dietitian@example.com', role='dietitian')
+            name = default_storage.save('community/posts/photo.tiff', ContentFile(tiff.getvalue()))
+            post = Post.objects.create(author=author, title='Post', content='-', image=name)
+            variants = store_derivatives(
+                post.pk, name, result['derivatives'], result['original'], result['original_extension']
+            )
+            self.assertEqual(variants['source'], 'community/posts/photo.png')
+            self.assertFalse(default_storage.exists(name))
+            post.refresh_from_db()
+            self.assertEqual(post.image.name, variants['source'])
+
+    def test_original_stripped_and_previous_derivatives_deleted(self):
+        def photo(color):
+            exif = Image.Exif()
+            exif[0x010F] = 'Téléphone'
+            data = io.BytesIO()
+            Image.new('RGB', (800, 400), color).save(data, 'JPEG', exif=exif.tobytes())
+            return data.getvalue()
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            author = CustomUser.objects.create(email='dietitian@example.com', role='dietitian')
+            post = Post.objects.create(author=author, title='Post', content='-')
+            previous = None
+            for color in ('red', 'blue'):
+                name = default_storage.save(f'community/posts/{color}.jpg', ContentFile(photo(color)))
+                Post.objects.filter(pk=post.pk).update(image=name)
+                result = render_post_image(photo(color))
+                variants = store_derivatives(
+                    post.pk, name, result['derivatives'], result['original'], result['original_extension']
+                )
+
+                with default_storage.open(variants['source'], 'rb') as original:
+                    self.assertEqual(dict(Image.open(original).getexif()), {})
+                self.assertTrue(all(default_storage.exists(n) for n in variant_names(variants)))
+                if previous:
+                    # Image remplacée : les dérivés précédents sont supprimés
+                    self.assertFalse(any(default_storage.exists(n) for n in variant_names(previous)))
+                previous = variants
@@ -0,0 +1,58 @@
+from patients.pagination import CursorPaginator
+from .models import Comment
+
+# -----------------------------
+# Fils de discussion
+# Une page de commentaires de premier niveau (curseur sur created_at, id),
+# puis toutes leurs réponses en une requête grâce à Comment.root, quelle que
+# soit la profondeur. L'arbre est assemblé en mémoire : le template ne
+# déclenche plus aucune requête (ni replies.all, ni user par réponse).
+# -----------------------------
+THREAD_PAGE_SIZE = 20
+THREAD_ORDERING = ('-created_at', '-id')
+
+
+def build_tree(roots, descendants):
+    """Rattache chaque réponse à son parent : `comment.children` (ordre de `descendants`)."""
+    nodes = {comment.pk: comment for comment in roots}
+    for comment in (*roots, *descendants):
+        comment.children = []
+    nodes.update((comment.pk, comment) for comment in descendants)
+    for comment in descendants:
+        parent = nodes.get(comment.parent_id)
+        if parent is not None:
+            parent.children.append(comment)
+    return roots
+
+
+def thread_page(post, cursor=None, per_page=THREAD_PAGE_SIZE):
+    """Page de commentaires de premier niveau, sans leurs réponses (une requête)."""
+    top_level = Comment.objects.filter(post=post, root__isnull=True).select_related('user')
+    return CursorPaginator(top_level, per_page, THREAD_ORDERING).get_page(cursor)
+
+
+def attach_replies(page):
+    """Charge toutes les réponses de la page en une requête et les rattache (`comment.children`)."""
+    descendants = []
+    if page.object_list:
+        descendants = list(
+            Comment.objects.filter(root__in=page.object_list).select_related('user').order_by(*THREAD_ORDERING)
+        )
+    build_tree(page.object_list, descendants)
+    return page
+
+
+def comment_thread(post, cursor=None, per_page=THREAD_PAGE_SIZE):
+    """Page de commentaires de premier niveau, chacun avec ses réponses imbriquées."""
+    return attach_replies(thread_page(post, cursor, per_page))
+
+
+def page_key(page):
+    """
+    Identifie la page réellement renvoyée (bornes et liens de navigation),
+    quel que soit le jeton reçu : des jetons invalides ou fabriqués qui mènent
+    à la même page partagent la même entrée de cache.
+    """
+    if not page.object_list:
+        return ''
+    return f'{page.object_list[0].pk}:{page.object_list[-1].pk}:{page.has_previous:d}{page.has_next:d}'
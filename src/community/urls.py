@@ -6,5 +6,6 @@ urlpatterns = [
     path('feed/', views.community_feed, name='community_feed'),
     path('post/new/', views.create_post, name='create_post'),
     path('post/<int:pk>/delete/', views.delete_post, name='delete_post'),
+    path('post/<int:pk>/react/', views.toggle_reaction, name='toggle_reaction'),
     path('comment/<int:pk>/delete/', views.delete_comment, name='delete_comment'),
 ]
\ No newline at end of file
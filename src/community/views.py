@@ -2,13 +2,30 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.utils.translation import gettext_lazy as _
-from .models import Post, Comment
+from .models import Post, Comment, Reaction
 from .forms import PostForm, CommentForm
 from django.contrib import messages
+from patients.pagination import CursorPaginator
+from .counters import buffer_increment
+from .fragments import cached_fragment, cached_fragments
+from django.template.loader import render_to_string
+from .threads import attach_replies, page_key, thread_page
+
+FEED_PAGE_SIZE = 12
+FEED_ORDERING = ('-is_pinned', '-created_at', '-id')
+
 
 @login_required
 def community_feed(request):
-    posts = Post.objects.all().prefetch_related('comments__user')
+    # Une requête pour la page visible ; les compteurs sont des colonnes du post
+    paginator = CursorPaginator(Post.objects.all(), FEED_PAGE_SIZE, FEED_ORDERING)
+    posts = paginator.get_page(request.GET.get('cursor'))
+    # Cartes inchangées lues dans le cache ; compteurs et boutons rendus à chaque requête
+    cards = cached_fragments('post-card', posts.object_list, lambda post: render_to_string(
+        'community/partials/post_card.html', {'post': post}
+    ))
+    for post in posts:
+        post.card_html = cards[post.pk]
     comment_form = CommentForm()
     post_form = PostForm() # Pour la modale
     
@@ -33,9 +50,7 @@ def community_feed(request):
 
 @login_required
 def post_detail(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    # On récupère uniquement les commentaires "parents" (ceux qui n'ont pas de parent_id)
-    comments = post.comments.filter(parent=None)
+    post = get_object_or_404(Post.objects.select_related('author'), pk=pk)
     comment_form = CommentForm()
 
     if request.method == 'POST':
@@ -48,19 +63,53 @@ def post_detail(request, pk):
             # On vérifie si c'est une réponse
             parent_id = request.POST.get('parent_id')
             if parent_id:
-                parent_obj = Comment.objects.get(id=parent_id)
+                parent_obj = get_object_or_404(Comment, id=parent_id, post=post)
                 comment.parent = parent_obj
                 
             comment.save()
             messages.success(request, _("Message envoyé !"))
             return redirect('post_detail', pk=post.pk)
 
+    # Vue comptée en mémoire, écrite avec le prochain lot
+    buffer_increment(post.pk, 'view_count')
+
+    # Article et page de discussion en cache (version du post). La page de
+    # commentaires "parents" est toujours lue (une requête indexée) : la clé du
+    # fragment décrit la page renvoyée, pas le jeton brut de l'URL. En cas de
+    # succès, les réponses ne sont pas lues (voir threads.py)
+    page = thread_page(post, request.GET.get('cursor'))
+    article_html = cached_fragment('article', post, lambda post: render_to_string(
+        'community/partials/post_article.html', {'post': post}
+    ))
+    thread_html = cached_fragment('thread', post, lambda post: render_to_string(
+        'community/partials/comment_thread.html', {'comments': attach_replies(page)}
+    ), variant=page_key(page))
+    # Boutons de suppression rendus à chaque requête, hors du fragment partagé
+    deletable_comment_ids = [
+        comment.pk for comment in page.object_list
+        if request.user.role == 'dietitian' or comment.user_id == request.user.pk
+    ]
     return render(request, 'community/post_detail.html', {
         'post': post,
-        'comments': comments,
-        'comment_form': comment_form
+        'article_html': article_html,
+        'thread_html': thread_html,
+        'deletable_comment_ids': deletable_comment_ids,
+        'comment_form': comment_form,
+        'has_reacted': post.reactions.filter(user=request.user).exists(),
     })
 
+
+@login_required
+@require_POST
+def toggle_reaction(request, pk):
+    post = get_object_or_404(Post, pk=pk)
+    deleted = Reaction.objects.filter(post=post, user=request.user).delete()[0]
+    if deleted:
+        buffer_increment(post.pk, 'reaction_count', -1)
+    elif Reaction.objects.get_or_create(post=post, user=request.user)[1]:
+        buffer_increment(post.pk, 'reaction_count', 1)
+    return redirect('post_detail', pk=post.pk)
+
 @login_required
 def create_post(request):
     if request.user.role == 'dietitian' and request.method == 'POST':
@@ -103,7 +152,7 @@ def toggle_pin_post(request, pk):
     
     post = get_object_or_404(Post, pk=pk)
     post.is_pinned = not post.is_pinned # Inverse l'état (True -> False ou inversement)
-    post.save()
+    post.save(update_fields=['is_pinned'])
     
     status = "épinglé" if post.is_pinned else "désépinglé"
     messages.success(request, f"Le post a été {status}.")
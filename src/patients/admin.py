@@ -1,8 +1,20 @@
 from django.contrib import admin
-from .models import PatientProfile, Consultation, MealPlan, FoodDiary
+from .models import PatientProfile, Consultation, MealPlan, MealPlanTemplate, MealPlanTemplateDay, FoodDiary, ExportJob
 
 # Register your models here.
 admin.site.register(PatientProfile)
 admin.site.register(Consultation)
 admin.site.register(MealPlan)
-admin.site.register(FoodDiary)
\ No newline at end of file
+admin.site.register(FoodDiary)
+admin.site.register(ExportJob)
+
+class MealPlanTemplateDayInline(admin.StackedInline):
+    model = MealPlanTemplateDay
+    extra = 0
+    max_num = 7
+
+
+@admin.register(MealPlanTemplate)
+class MealPlanTemplateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'created_by', 'created_at']
+    inlines = [MealPlanTemplateDayInline]
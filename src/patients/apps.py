@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class PatientsConfig(AppConfig):
     name = 'patients'
+
+    def ready(self):
+        # Branche les signaux (invalidation du marqueur de profil complet)
+        from . import signals  # noqa: F401
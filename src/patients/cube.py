@@ -0,0 +1,164 @@
+# Cube statistique multidimensionnel pour la diététicienne.
+# Tous les regroupements (2^5 combinaisons de dimensions, '*' = toutes valeurs)
+# sont précalculés en mémoire : une tranche se lit par une recherche de dictionnaire.
+# Reconstruction en arrière-plan sur signal, ou après CUBE_MAX_AGE (autres processus).
+import itertools
+import logging
+import threading
+import time
+
+from django.db import connection
+from .models import Consultation, PatientProfile, classify_bmi
+
+ALL = '*'
+
+DIMENSIONS = ['gender', 'activity_level', 'age_band', 'bmi_class', 'diagnosis']
+
+# Mesures issues du profil puis de la dernière consultation du patient
+PROFILE_MEASURES = ['age', 'bmi']
+CONSULTATION_MEASURES = ['weight', 'total_cholesterol', 'ldl', 'hdl', 'triglycerides', 'hba1c']
+MEASURES = PROFILE_MEASURES + CONSULTATION_MEASURES
+
+AGE_BANDS = [(18, '<18'), (30, '18-29'), (40, '30-39'), (50, '40-49'), (60, '50-59'), (70, '60-69')]
+
+# Au-delà, un processus qui n'a pas reçu les signaux relance une reconstruction
+CUBE_MAX_AGE = 300
+# Attente avant reconstruction : une rafale d'enregistrements (import, saisie) n'en coûte qu'une
+REBUILD_DELAY = 2
+
+logger = logging.getLogger(__name__)
+
+
+def age_band(age):
+    if age is None:
+        return 'unknown'
+    for limit, label in AGE_BANDS:
+        if age < limit:
+            return label
+    return '70+'
+
+
+def normalize_diagnosis(diagnosis):
+    return ' '.join(diagnosis.split()).lower() or 'unknown'
+
+
+class StatsCube:
+    def __init__(self, cells, values, built_at):
+        self.cells = cells      # clé (une valeur ou '*' par dimension) -> [count, somme, n, somme, n, ...]
+        self.values = values    # dimension -> valeurs rencontrées
+        self.built_at = built_at
+
+    @classmethod
+    def build(cls):
+        # 1. Dernière consultation par patient (une seule requête, lecture par lots ;
+        # ordre total : la dernière ligne lue par patient est toujours la même)
+        latest = {}
+        consultations = Consultation.objects.order_by(
+            'patient_id', 'date_consultation', 'created_at', 'id'
+        ).values_list('patient_id', *CONSULTATION_MEASURES)
+        for row in consultations.iterator(chunk_size=2000):
+            latest[row[0]] = row[1:]
+        empty = (None,) * len(CONSULTATION_MEASURES)
+
+        # 2. Agrégation de chaque profil dans les 32 cellules qui le contiennent
+        cells, values = {}, {dimension: set() for dimension in DIMENSIONS}
+        masks = list(itertools.product((False, True), repeat=len(DIMENSIONS)))
+        profiles = PatientProfile.objects.values_list('user_id', 'gender', 'activity_level', 'age', 'diagnosis', *PROFILE_MEASURES)
+        for user_id, gender, activity_level, age, diagnosis, *measures in profiles.iterator(chunk_size=2000):
+            key = (
+                gender or 'unknown',
+                activity_level or 'unknown',
+                age_band(age),
+                classify_bmi(measures[PROFILE_MEASURES.index('bmi')]) or 'unknown',
+                normalize_diagnosis(diagnosis),
+            )
+            for dimension, value in zip(DIMENSIONS, key):
+                values[dimension].add(value)
+
+            row = list(measures) + list(latest.get(user_id, empty))
+            for mask in masks:
+                cell_key = tuple(ALL if rolled else value for rolled, value in zip(mask, key))
+                cell = cells.get(cell_key)
+                if cell is None:
+                    cell = cells[cell_key] = [0] + [0.0, 0] * len(MEASURES)
+                cell[0] += 1
+                for i, value in enumerate(row):
+                    if value is not None:
+                        cell[1 + 2 * i] += value
+                        cell[2 + 2 * i] += 1
+
+        return cls(cells, {dimension: sorted(v) for dimension, v in values.items()}, time.time())
+
+    def _key(self, filters):
+        unknown = set(filters) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Dimensions inconnues : {', '.join(sorted(unknown))}")
+        return tuple(filters.get(dimension) or ALL for dimension in DIMENSIONS)
+
+    def query(self, **filters):
+        """Effectif et moyennes d'une tranche, ex. query(gender='Female', age_band='40-49')."""
+        cell = self.cells.get(self._key(filters))
+        result = {'count': cell[0] if cell else 0}
+        for i, measure in enumerate(MEASURES):
+            n = cell[2 + 2 * i] if cell else 0
+            result[f'avg_{measure}'] = cell[1 + 2 * i] / n if n else None
+        return result
+
+    def breakdown(self, dimension, **filters):
+        """Répartition d'une tranche selon une dimension, ex. breakdown('bmi_class', gender='Male')."""
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Dimension inconnue : {dimension}")
+        return {value: self.query(**{**filters, dimension: value}) for value in self.values[dimension]}
+
+
+# -----------------------------
+# Instance partagée du processus et reconstruction en arrière-plan
+# -----------------------------
+_cube = None
+_lock = threading.Lock()
+_dirty = threading.Event()   # Reconstruction demandée depuis le dernier calcul
+_worker = None               # Unique thread de reconstruction du processus
+_worker_lock = threading.Lock()
+
+
+def get_cube():
+    """Cube courant ; construit de façon synchrone au premier appel seulement."""
+    global _cube
+    if _cube is None:
+        with _lock:
+            if _cube is None:
+                _cube = StatsCube.build()
+    elif time.time() - _cube.built_at > CUBE_MAX_AGE:
+        schedule_rebuild()
+    return _cube
+
+
+def schedule_rebuild():
+    """
+    Demande une reconstruction : lève le drapeau et démarre, au besoin, le
+    thread de reconstruction. Les demandes arrivées avant ou pendant un calcul
+    sont regroupées. Sans cube chargé (processus qui ne sert pas la page),
+    rien à faire : le premier get_cube() lira des données à jour.
+    """
+    global _worker
+    if _cube is None:
+        return
+    _dirty.set()
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_rebuild_loop, name='stats-cube-rebuild', daemon=True)
+            _worker.start()
+
+
+def _rebuild_loop():
+    global _cube
+    while True:
+        _dirty.wait()
+        time.sleep(REBUILD_DELAY)
+        _dirty.clear()  # Une demande arrivée pendant le calcul relance un tour
+        try:
+            _cube = StatsCube.build()
+        except Exception:
+            logger.exception("Reconstruction du cube statistique échouée")
+        finally:
+            connection.close()  # Connexion propre à ce thread, pas gardée entre deux calculs
@@ -0,0 +1,166 @@
+import uuid
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from .forms import FoodDiaryBatchForm
+from .models import FoodDiary, FoodDiaryTombstone
+from .pagination import CursorPaginator
+
+# -----------------------------
+# Journal alimentaire : saisie groupée (journée, semaine, synchronisation mobile)
+# Toutes les lignes sont validées avec FoodDiaryBatchForm puis insérées en un seul
+# bulk_create. L'identifiant (UUID) peut être fourni par le client : renvoyer
+# le même lot après une coupure réseau ne crée pas de doublons.
+# -----------------------------
+MAX_BATCH_SIZE = 500
+
+# Synchronisation : pages compactes (tableaux plutôt qu'objets)
+SYNC_PAGE_SIZE = 200
+MAX_SYNC_PAGE_SIZE = 1000
+SYNC_FIELDS = ['id', 'date', 'meal_time', 'description', 'beverage', 'updated_at']
+# Durée maximale entre l'horodatage d'une ligne (updated_at, deleted_at) et la
+# validation de sa transaction : plus longue transaction d'écriture + décalage d'horloge
+SYNC_SAFETY_MARGIN = timedelta(minutes=5)
+
+
+def ingest_food_entries(patient, rows):
+    """
+    Valide et insère les repas `rows` (liste de dicts) pour `patient`.
+    Retourne (nombre créé, résultats ligne par ligne).
+    Statuts : created, duplicate (déjà enregistré : renvoi idempotent), invalid.
+    """
+    results = [None] * len(rows)
+    pending = []  # (index, entrée à insérer)
+
+    # 1. Validation de chaque ligne
+    ids = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            results[index] = {'index': index, 'status': 'invalid', 'errors': {'__all__': [_("Objet attendu.")]}}
+            continue
+        try:
+            entry_id = uuid.UUID(str(row['id'])) if row.get('id') else uuid.uuid4()
+        except ValueError:
+            results[index] = {'index': index, 'status': 'invalid', 'errors': {'id': [_("UUID invalide.")]}}
+            continue
+
+        form = FoodDiaryBatchForm(data=row)
+        if not form.is_valid():
+            results[index] = {'index': index, 'id': str(entry_id), 'status': 'invalid', 'errors': form.errors.get_json_data()}
+            continue
+        if entry_id in ids:
+            # Même identifiant deux fois dans le lot : seule la première ligne compte
+            results[index] = {'index': index, 'id': str(entry_id), 'status': 'duplicate'}
+            continue
+
+        entry = form.save(commit=False)
+        entry.id = entry_id
+        entry.patient = patient
+        ids[entry_id] = index
+        pending.append((index, entry))
+
+    # 2. Identifiants déjà en base (une seule requête) : lot renvoyé après une erreur réseau
+    existing = dict(FoodDiary.objects.filter(id__in=ids).values_list('id', 'patient_id'))
+    entries = []
+    for index, entry in pending:
+        owner = existing.get(entry.id)
+        if owner is None:
+            entries.append((index, entry))
+        elif owner == patient.pk:
+            results[index] = {'index': index, 'id': str(entry.id), 'status': 'duplicate'}
+        else:
+            results[index] = {'index': index, 'id': str(entry.id), 'status': 'invalid', 'errors': {'id': [_("Identifiant déjà utilisé.")]}}
+
+    # 3. Insertion groupée, tout ou rien ; ignore_conflicts couvre deux envois simultanés du même lot
+    with transaction.atomic():
+        FoodDiary.objects.bulk_create([entry for _index, entry in entries], batch_size=MAX_BATCH_SIZE, ignore_conflicts=True)
+
+        # 4. Statut relu après l'insertion : une ligne ignorée (conflit) n'a pas notre created_at
+        stored = {
+            pk: (owner, created_at)
+            for pk, owner, created_at in FoodDiary.objects.filter(id__in=[entry.id for _index, entry in entries])
+            .values_list('id', 'patient_id', 'created_at')
+        }
+    created = 0
+    for index, entry in entries:
+        owner, created_at = stored.get(entry.id, (None, None))
+        if owner == patient.pk and created_at == entry.created_at:
+            results[index] = {'index': index, 'id': str(entry.id), 'status': 'created'}
+            created += 1
+        elif owner == patient.pk:
+            results[index] = {'index': index, 'id': str(entry.id), 'status': 'duplicate'}
+        else:
+            results[index] = {'index': index, 'id': str(entry.id), 'status': 'invalid', 'errors': {'id': [_("Identifiant déjà utilisé.")]}}
+
+    return created, results
+
+
+# -----------------------------
+# Synchronisation "modifié depuis" pour les clients hors ligne
+# Le jeton contient la position atteinte dans deux flux triés :
+# repas par (updated_at, id) et suppressions par (deleted_at, id).
+# Chaque appel ne lit que ce qui suit ces positions (index patient + date).
+# Une ligne horodatée avant sa validation (transaction longue) peut apparaître
+# derrière une position déjà rendue : la position de fin de synchronisation ne
+# dépasse donc jamais "maintenant - SYNC_SAFETY_MARGIN", et les lignes plus
+# récentes sont relues à l'appel suivant (le client les remplace par id).
+# -----------------------------
+def _sync_page(paginator, cursor, limit, watermark):
+    _, values = paginator.decode_cursor(cursor)
+    rows = paginator.queryset.order_by(*paginator.ordering)
+    if values is not None:
+        rows = rows.filter(paginator._after(values, False))
+    rows = list(rows[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        # Sans nouvelle ligne, on garde la position précédente
+        return rows, cursor or '', has_more
+    last = rows[-1]
+    timestamp = paginator.fields[0]
+    if not has_more and getattr(last, timestamp) > watermark:
+        # Dernière page : la position s'arrête au filigrane. Les pages pleines
+        # avancent exactement, sinon un lot récent de plus de `limit` lignes
+        # serait relu sans fin.
+        last = paginator.queryset.model(**{timestamp: watermark, 'id': uuid.UUID(int=0)})
+    return rows, paginator.encode_cursor(last, 'n'), has_more
+
+
+def food_diary_changes(patient, token='', limit=SYNC_PAGE_SIZE):
+    """
+    Modifications du journal depuis `token` ('' : tout l'historique).
+    Retourne un dict compact : champs, lignes modifiées, identifiants supprimés,
+    jeton suivant et `more` (rappeler immédiatement avec le nouveau jeton).
+    Les modifications des SYNC_SAFETY_MARGIN dernières minutes sont renvoyées
+    à nouveau au prochain appel : le client applique les lignes par id.
+    """
+    watermark = timezone.now() - SYNC_SAFETY_MARGIN
+    entries_cursor, _, tombstones_cursor = (token or '').partition('.')
+
+    entries = CursorPaginator(
+        FoodDiary.objects.filter(patient=patient).only(*SYNC_FIELDS), limit, ('updated_at', 'id')
+    )
+    tombstones = CursorPaginator(
+        FoodDiaryTombstone.objects.filter(patient=patient), limit, ('deleted_at', 'id')
+    )
+    changed, entries_cursor, more_entries = _sync_page(entries, entries_cursor, limit, watermark)
+    deleted, tombstones_cursor, more_tombstones = _sync_page(tombstones, tombstones_cursor, limit, watermark)
+
+    return {
+        'fields': SYNC_FIELDS,
+        'changed': [
+            [str(e.id), e.date.isoformat(), e.meal_time, e.description, e.beverage, e.updated_at.isoformat()]
+            for e in changed
+        ],
+        'deleted': [str(t.entry_id) for t in deleted],
+        'next': f'{entries_cursor}.{tombstones_cursor}',
+        'more': more_entries or more_tombstones,
+    }
+
+
+def remove_food_entry(entry):
+    # Suppression + trace pour les clients synchronisés, dans la même transaction
+    with transaction.atomic():
+        FoodDiaryTombstone.objects.create(patient_id=entry.patient_id, entry_id=entry.id)
+        entry.delete()
@@ -0,0 +1,112 @@
+import time
+from django.conf import settings
+from django.core.cache import cache, caches
+from .models import PatientProfile
+
+# -----------------------------
+# Besoins énergétiques (kcal/jour)
+# Dépense de repos (REE) par équation prédictive, puis dépense totale (TEE)
+# = REE x coefficient d'activité. Calcul colonne par colonne sur toute la
+# patientèle (une requête values_list), mis en cache jusqu'à la prochaine
+# modification d'un profil. Pour un patient (ou quelques-uns), le calcul part
+# directement de leurs lignes de profil.
+# -----------------------------
+
+# Coefficients d'activité physique (PAL) associés à PatientProfile.activity_level
+ACTIVITY_FACTORS = {
+    'sedentary': 1.2,
+    'low': 1.375,
+    'moderate': 1.55,
+    'intense': 1.725,
+}
+
+# Équations : coefficients (poids kg, taille cm, âge ans, constante) par sexe
+EQUATIONS = {
+    # Mifflin-St Jeor (1990) : recommandée par défaut
+    'mifflin': {'Male': (10, 6.25, -5, 5), 'Female': (10, 6.25, -5, -161)},
+    # Harris-Benedict révisée (Roza et Shizgal, 1984)
+    'harris_benedict': {'Male': (13.397, 4.799, -5.677, 88.362), 'Female': (9.247, 3.098, -4.330, 447.593)},
+}
+DEFAULT_EQUATION = 'mifflin'
+
+ENERGY_VERSION_KEY = 'energy:version'
+ENERGY_TIMEOUT = 60 * 60 * 24
+ENERGY_COLUMNS = ['user_id', 'age', 'gender', 'height', 'weight', 'activity_level']
+
+
+def resting_energy(weights, heights, ages, genders, equation=DEFAULT_EQUATION):
+    """REE pour des colonnes de même longueur (taille en cm ou en m) ; None si une donnée manque."""
+    coefficients = EQUATIONS[equation]
+    values = []
+    for weight, height, age, gender in zip(weights, heights, ages, genders):
+        c = coefficients.get(gender)
+        if c is None or not (weight and height and age):
+            values.append(None)
+            continue
+        height_cm = height if height > 3 else height * 100
+        values.append(c[0] * weight + c[1] * height_cm + c[2] * age + c[3])
+    return values
+
+
+def total_energy(rees, activity_levels):
+    return [
+        ree * ACTIVITY_FACTORS[level] if ree is not None and level in ACTIVITY_FACTORS else None
+        for ree, level in zip(rees, activity_levels)
+    ]
+
+
+def compute_energy_requirements(rows, equation=DEFAULT_EQUATION):
+    """
+    rows : tuples dans l'ordre de ENERGY_COLUMNS.
+    Retourne {user_id: {'ree': kcal, 'tee': kcal, 'factor': PAL}} pour les profils complets.
+    """
+    if not rows:
+        return {}
+    user_ids, ages, genders, heights, weights, levels = zip(*rows)
+    rees = resting_energy(weights, heights, ages, genders, equation)
+    tees = total_energy(rees, levels)
+    return {
+        str(user_id): {'ree': round(ree), 'tee': round(tee), 'factor': ACTIVITY_FACTORS[level]}
+        for user_id, ree, tee, level in zip(user_ids, rees, tees, levels)
+        if tee is not None
+    }
+
+
+def cohort_energy_requirements(equation=DEFAULT_EQUATION):
+    """Besoins de toute la patientèle, mis en cache (invalidé par les signaux de PatientProfile)."""
+    version = caches[settings.PERSISTENT_CACHE_ALIAS].get_or_set(ENERGY_VERSION_KEY, time.time_ns, None)
+    key = f'energy:{version}:{equation}'
+    requirements = cache.get(key)
+    if requirements is None:
+        rows = PatientProfile.objects.filter(user__role='patient').values_list(*ENERGY_COLUMNS)
+        requirements = compute_energy_requirements(list(rows.iterator(chunk_size=2000)), equation)
+        cache.set(key, requirements, ENERGY_TIMEOUT)
+    return requirements
+
+
+def profile_energy_requirements(profiles, equation=DEFAULT_EQUATION):
+    """Besoins calculés depuis des profils déjà chargés (aucune requête)."""
+    rows = [tuple(getattr(profile, column) for column in ENERGY_COLUMNS) for profile in profiles]
+    return compute_energy_requirements(rows, equation)
+
+
+def patient_energy_requirements(user_id, equation=DEFAULT_EQUATION):
+    """Besoins d'un patient (None si le profil est incomplet), depuis sa seule ligne de profil."""
+    rows = PatientProfile.objects.filter(user_id=user_id, user__role='patient').values_list(*ENERGY_COLUMNS)
+    return compute_energy_requirements(list(rows), equation).get(str(user_id))
+
+
+def energy_summary(requirements):
+    """Moyennes de la patientèle pour la page de statistiques."""
+    if not requirements:
+        return {'count': 0, 'avg_ree': None, 'avg_tee': None}
+    count = len(requirements)
+    return {
+        'count': count,
+        'avg_ree': sum(r['ree'] for r in requirements.values()) / count,
+        'avg_tee': sum(r['tee'] for r in requirements.values()) / count,
+    }
+
+
+def invalidate_energy_requirements():
+    caches[settings.PERSISTENT_CACHE_ALIAS].set(ENERGY_VERSION_KEY, time.time_ns(), None)
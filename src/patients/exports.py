@@ -0,0 +1,219 @@
+import csv
+import hashlib
+import json
+import tempfile
+from datetime import timedelta
+import openpyxl
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from .pagination import CursorPaginator
+from .search import patient_search_filter, trigram_threshold
+
+User = get_user_model()
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# En-têtes basés sur les modèles User / PatientProfile
+PATIENT_HEADERS = [
+    'Fist name', 'Last Name', 'Email', 'Nom d\'utilisateur', 'Rôle',
+    'Âge', 'Genre', 'Profession', 'Niveau d\'activité',
+    'Diagnostic', 'Taille (cm)', 'Poids (kg)', 'IMC (BMI)'
+]
+
+# Taille des lots lus en base (mémoire constante quel que soit le nombre de patients)
+CHUNK_SIZE = 2000
+
+# Au-delà, un job "pending"/"running" est considéré comme abandonné (worker arrêté)
+EXPORT_JOB_TIMEOUT = timedelta(minutes=30)
+
+
+def patient_export_queryset(search_query=None):
+    """Patients à exporter, avec le même filtrage que la liste de la diététicienne."""
+    patients = User.objects.filter(role='patient').select_related('profile').order_by('last_name')
+
+    if search_query:
+        patients = patients.filter(patient_search_filter(search_query))
+    return patients
+
+
+def patient_export_covers(params, user_id):
+    """Le patient `user_id` fait-il partie de l'export généré avec ces paramètres ?"""
+    with trigram_threshold():
+        return patient_export_queryset(params.get('q')).filter(pk=user_id).exists()
+
+
+def iter_patients(patients):
+    """
+    Patients par lots de CHUNK_SIZE, lus par clé (nom, id) : chaque lot dans
+    une transaction courte (seuil de recherche, voir trigram_threshold), sans
+    transaction ouverte pendant l'écriture du fichier.
+    """
+    paginator = CursorPaginator(patients, CHUNK_SIZE, ('last_name', 'id'))
+    cursor = None
+    while True:
+        with trigram_threshold():
+            page = paginator.get_page(cursor)
+        yield from page.object_list
+        if not page.has_next:
+            return
+        cursor = page.next_cursor
+
+
+def iter_patient_rows(patients):
+    """Une ligne par patient, profil joint (pas de requête par ligne)."""
+    for patient in iter_patients(patients):
+        # On utilise le related_name='profile' défini dans le modèle
+        profile = getattr(patient, 'profile', None)
+
+        yield [
+            patient.first_name,
+            patient.last_name,
+            patient.email,
+            patient.username,
+            patient.role,
+            profile.age if profile else "N/A",
+            profile.get_gender_display() if profile else "N/A", # Pour avoir 'Male' au lieu de 'M'
+            profile.occupation if profile else "N/A",
+            profile.get_activity_level_display() if profile else "N/A",
+            profile.diagnosis if profile else "N/A",
+            profile.height if profile else "N/A",
+            profile.weight if profile else "N/A",
+            profile.bmi if profile else "N/A",
+        ]
+
+
+def write_patients_xlsx(patients, output, progress=None):
+    """
+    Écrit le classeur dans `output` (chemin ou fichier binaire).
+    Feuille en mode write_only : les lignes partent sur disque au fil de
+    l'eau au lieu de rester en mémoire.
+    `progress(done, total)` est appelé après chaque lot si fourni.
+    """
+    if progress:
+        with trigram_threshold():
+            total = patients.count()
+    else:
+        total = 0
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Liste des Patients")
+    ws.append(PATIENT_HEADERS)
+    for done, row in enumerate(iter_patient_rows(patients), start=1):
+        ws.append(row)
+        if progress and done % CHUNK_SIZE == 0:
+            progress(done, total)
+    wb.save(output)
+
+
+def build_patients_xlsx(patients):
+    """Génère le classeur dans un fichier temporaire, rembobiné, prêt à être streamé."""
+    output = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    write_patients_xlsx(patients, output)
+    output.seek(0)
+    return output
+
+
+# -----------------------------
+# Exports en arrière-plan (voir ExportJob et la commande run_export_worker)
+# -----------------------------
+def export_patients_xlsx(params, output, progress=None):
+    write_patients_xlsx(patient_export_queryset(params.get('q')), output, progress=progress)
+
+
+# Types d'export disponibles : ajouter ici les futurs exports PDF / CSV
+EXPORT_KINDS = {
+    'patients_xlsx': {
+        'writer': export_patients_xlsx,
+        'filename': 'export_patients_complet.xlsx',
+        'content_type': XLSX_CONTENT_TYPE,
+        # Modèles dont la modification périme l'export
+        'depends_on': ('users.CustomUser', 'patients.PatientProfile'),
+        # L'export contient-il la ligne modifiée ? (sinon il reste valide)
+        'covers': patient_export_covers,
+    },
+}
+
+
+def export_cache_key(kind, params):
+    """Empreinte stable d'un export : même type + mêmes paramètres = même fichier."""
+    payload = json.dumps([kind, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# -----------------------------
+# Exports recherche (CSV / NDJSON en flux)
+# -----------------------------
+class Echo:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire."""
+    def write(self, value):
+        return value
+
+
+# Jeux de données exportables et colonnes autorisées (projection)
+RESEARCH_DATASETS = {
+    'consultations': {
+        'model': 'patients.Consultation',
+        'date_field': 'date_consultation',
+        'fields': [
+            'id', 'patient_id', 'date_consultation', 'total_cholesterol',
+            'ldl', 'hdl', 'triglycerides', 'hba1c', 'weight',
+        ],
+    },
+    'food_diary': {
+        'model': 'patients.FoodDiary',
+        'date_field': 'date',
+        'fields': [
+            'id', 'patient_id', 'date', 'meal_time', 'description', 'beverage', 'created_at',
+        ],
+    },
+}
+
+RESEARCH_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def research_queryset(dataset, fields=None, since=None, until=None):
+    """
+    Lignes du jeu de données sous forme de tuples : seules les colonnes
+    demandées sont lues en base. Lève ValueError si une colonne n'est pas autorisée.
+    """
+    spec = RESEARCH_DATASETS[dataset]
+    fields = fields or spec['fields']
+    unknown = [f for f in fields if f not in spec['fields']]
+    if unknown:
+        raise ValueError(f"Colonnes inconnues : {', '.join(unknown)}")
+
+    date_field = spec['date_field']
+    rows = apps.get_model(spec['model']).objects.order_by(date_field, 'id')
+    if since:
+        rows = rows.filter(**{f'{date_field}__gte': since})
+    if until:
+        rows = rows.filter(**{f'{date_field}__lte': until})
+    return fields, rows.values_list(*fields)
+
+
+def iter_research_export(fields, rows, fmt):
+    """
+    Génère l'export morceau par morceau. iterator() utilise un curseur
+    côté serveur sur PostgreSQL : la mémoire reste bornée quel que soit le volume.
+    """
+    if fmt == 'csv':
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        encode = writer.writerow
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        encode = lambda row: encoder.encode(dict(zip(fields, row))) + '\n'
+
+    # On regroupe les lignes par lot pour limiter le nombre d'écritures réseau
+    buffer = []
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        buffer.append(encode(row))
+        if len(buffer) >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
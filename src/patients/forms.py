@@ -1,5 +1,8 @@
+import datetime
 from django import forms
-from .models import PatientProfile, Consultation, FoodDiary, MealPlan
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from .models import PatientProfile, Consultation, FoodDiary, MealPlan, MealPlanTemplate
 from django.contrib.auth import get_user_model
 
 
@@ -94,6 +97,24 @@ class FoodDiaryForm(forms.ModelForm):
         }
 
 
+class FoodDiaryBatchForm(FoodDiaryForm):
+    """Saisie groupée / hors ligne : la date du repas est fournie par le client (aujourd'hui par défaut)."""
+    date = forms.DateField(required=False)
+
+    class Meta(FoodDiaryForm.Meta):
+        fields = ['date'] + FoodDiaryForm.Meta.fields
+
+    def clean_date(self):
+        date = self.cleaned_data.get('date')
+        today = timezone.localdate()
+        if date is None:
+            return today
+        # Un jour de marge : le client peut être sur un fuseau en avance
+        if date > today + datetime.timedelta(days=1):
+            raise forms.ValidationError(_("La date ne peut pas être dans le futur."))
+        return date
+
+
 # patients/forms.py
 class MealPlanForm(forms.ModelForm):
     class Meta:
@@ -104,4 +125,39 @@ class MealPlanForm(forms.ModelForm):
             'lunch': forms.Textarea(attrs={'rows': 2, 'class': 'form-control'}),
             'dinner': forms.Textarea(attrs={'rows': 2, 'class': 'form-control'}),
             'day': forms.Select(attrs={'class': 'form-select'}),
-        }
\ No newline at end of file
+        }
+
+class BaseMealPlanFormSet(forms.BaseModelFormSet):
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        # Le jour identifie la ligne (patient, jour) : non modifiable pour une journée existante
+        if not form.instance._state.adding:
+            form.fields['day'].disabled = True
+
+
+class MealPlanTemplateForm(forms.ModelForm):
+    class Meta:
+        model = MealPlanTemplate
+        fields = ['name', 'description']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Ex: Hypocalorique 1800 kcal'}),
+            'description': forms.Textarea(attrs={'rows': 2, 'class': 'form-control'}),
+        }
+
+
+class PatientChoiceField(forms.ModelMultipleChoiceField):
+    def label_from_instance(self, obj):
+        return obj.get_full_name() or obj.email
+
+
+# Attribution d'un modèle à plusieurs patients
+class MealPlanTemplateAssignForm(forms.Form):
+    patients = PatientChoiceField(
+        queryset=User.objects.filter(role='patient').order_by('last_name', 'first_name', 'email'),
+        widget=forms.CheckboxSelectMultiple,
+        label=_("Patients"),
+    )
+    replace = forms.BooleanField(
+        required=False,
+        label=_("Supprimer les jours du plan actuel absents du modèle"),
+    )
@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from patients.models import FoodDiary
+from patients.nutrition import analyze_descriptions
+
+
+class Command(BaseCommand):
+    help = "Analyse nutritionnelle de tout le journal alimentaire (tâche de nuit) : remplit le cache des descriptions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        # 1. Descriptions distinctes uniquement, lues par lots
+        descriptions = FoodDiary.objects.values_list('description', flat=True).distinct().order_by()
+        batch, total, unmatched = [], 0, 0
+        for description in descriptions.iterator(chunk_size=batch_size):
+            batch.append(description)
+            if len(batch) >= batch_size:
+                unmatched += self.analyze(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            unmatched += self.analyze(batch)
+            total += len(batch)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} description(s) analysée(s) en {elapsed:.1f} s, dont {unmatched} sans aliment reconnu."
+        ))
+
+    def analyze(self, batch):
+        # 2. Analyse (ou lecture du cache) et mise en cache groupée
+        results = analyze_descriptions(batch)
+        return sum(1 for result in results.values() if not result['items'])
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from patients.models import Consultation, PatientProfile
+
+
+class Command(BaseCommand):
+    help = "Calcule l'IMC et la classe d'IMC stockés sur les consultations existantes (par lots, bulk_update)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true', help="Recalcule aussi les consultations déjà renseignées.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # 1. Tailles des profils chargées une fois (consultations sans profil rattaché)
+        heights = dict(PatientProfile.objects.values_list('user_id', 'height'))
+
+        consultations = Consultation.objects.all()
+        if not options['all']:
+            consultations = consultations.filter(bmi__isnull=True, weight__isnull=False)
+        rows = consultations.select_related('patient_profile').only(
+            'id', 'patient_id', 'weight', 'bmi', 'bmi_class', 'patient_profile__height'
+        )
+
+        # 2. Calcul en Python, écriture groupée
+        batch, total = [], 0
+        for consult in rows.iterator(chunk_size=batch_size):
+            height = consult.patient_profile.height if consult.patient_profile_id else heights.get(consult.patient_id)
+            consult.compute_bmi(height)
+            batch.append(consult)
+            if len(batch) >= batch_size:
+                Consultation.objects.bulk_update(batch, ['bmi', 'bmi_class'])
+                total += len(batch)
+                batch = []
+
+        if batch:
+            Consultation.objects.bulk_update(batch, ['bmi', 'bmi_class'])
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} consultation(s) mise(s) à jour."))
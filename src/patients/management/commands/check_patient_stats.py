@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from patients.models import PatientStatsRollup
+from patients.stats import compute_live_stats, diff_stats
+
+
+class Command(BaseCommand):
+    help = "Compare le cumul des statistiques patients avec un recalcul complet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Remplace le cumul par le recalcul en cas d'écart.")
+
+    def handle(self, *args, **options):
+        stored = PatientStatsRollup.objects.filter(pk=1).first()
+        if stored is None:
+            raise CommandError("Aucun cumul enregistré : lancez rebuild_patient_stats.")
+
+        live = compute_live_stats()
+        differences = diff_stats(stored, live)
+        if not differences:
+            self.stdout.write(self.style.SUCCESS("Cumul cohérent avec les données."))
+            return
+
+        for attr, stored_value, live_value in differences:
+            self.stdout.write(f"{attr} : cumul={stored_value!r} recalcul={live_value!r}")
+        if options['fix']:
+            live.save()
+            self.stdout.write(self.style.WARNING("Cumul corrigé."))
+        else:
+            raise CommandError(f"{len(differences)} écart(s) détecté(s).")
@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from patients.exports import RESEARCH_DATASETS, RESEARCH_FORMATS, iter_research_export, research_queryset
+
+
+class Command(BaseCommand):
+    help = "Exporte en flux les données de recherche (consultations, journal alimentaire) en CSV ou NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=sorted(RESEARCH_DATASETS))
+        parser.add_argument('--format', default='csv', choices=sorted(RESEARCH_FORMATS))
+        parser.add_argument('--fields', default='', help="Colonnes séparées par des virgules (toutes par défaut).")
+        parser.add_argument('--since', default='', help="Date de début (AAAA-MM-JJ).")
+        parser.add_argument('--until', default='', help="Date de fin (AAAA-MM-JJ).")
+        parser.add_argument('--output', '-o', default='-', help="Fichier de sortie ('-' pour la sortie standard).")
+
+    def handle(self, *args, **options):
+        fields = [f.strip() for f in options['fields'].split(',') if f.strip()]
+        try:
+            fields, rows = research_queryset(
+                options['dataset'],
+                fields=fields,
+                since=parse_date(options['since']),
+                until=parse_date(options['until']),
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        chunks = iter_research_export(fields, rows, options['format'])
+        if options['output'] == '-':
+            self.write_chunks(sys.stdout, chunks)
+        else:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                self.write_chunks(output, chunks)
+
+    def write_chunks(self, output, chunks):
+        for chunk in chunks:
+            output.write(chunk)
@@ -0,0 +1,60 @@
+import os
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from patients.mealplans import draft_meal_plans
+from patients.models import MealPlan
+from patients.planner import DEFAULT_TIME_BUDGET, PLAN_TIMEOUT, SLOTS, plan_to_initial, plan_totals
+
+
+class Command(BaseCommand):
+    help = "Génère en parallèle des plans alimentaires de 7 jours (brouillons) ; --save les enregistre pour les patients sans plan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patient', action='append', default=[], help="Identifiant d'un patient (répétable).")
+        parser.add_argument('--without-plan', action='store_true', help="Tous les patients qui n'ont encore aucun plan.")
+        parser.add_argument('--budget', type=float, default=DEFAULT_TIME_BUDGET, help="Secondes de calcul par plan.")
+        parser.add_argument(
+            '--workers', type=int, default=max(1, (os.cpu_count() or 2) - 1),
+            help="Processus de calcul (pool dédié à la commande)."
+        )
+        parser.add_argument('--save', action='store_true', help="Enregistre les plans (patients sans plan uniquement).")
+
+    def handle(self, *args, **options):
+        patients = get_user_model().objects.filter(role='patient')
+        if options['patient']:
+            patients = patients.filter(pk__in=options['patient'])
+        elif not options['without_plan']:
+            self.stderr.write("Indiquez --patient <id> ou --without-plan.")
+            return
+        if options['without_plan'] or options['save']:
+            patients = patients.filter(meal_plans__isnull=True)
+        user_ids = list(patients.values_list('pk', flat=True))
+
+        # 1. Calcul parallèle dans le pool de processus
+        started = time.perf_counter()
+        plans = draft_meal_plans(user_ids, options['budget'], options['workers'])
+        elapsed = time.perf_counter() - started
+
+        # 2. Résumé et, si demandé, enregistrement groupé
+        rows = []
+        for user_id, plan in plans.items():
+            if plan is PLAN_TIMEOUT:
+                self.stdout.write(self.style.WARNING(f"{user_id} : calcul interrompu, à relancer (--budget plus long ?)."))
+                continue
+            if plan is None:
+                self.stdout.write(self.style.WARNING(f"{user_id} : aucun plan compatible."))
+                continue
+            self.stdout.write(f"{user_id} : " + ', '.join(f"{day[0]} kcal" for day in plan_totals(plan)))
+            if options['save']:
+                rows += [
+                    MealPlan(patient_id=user_id, day=day['day'], **{slot: day[slot] for slot in SLOTS})
+                    for day in plan_to_initial(plan)
+                ]
+        if rows:
+            MealPlan.objects.bulk_create(rows, ignore_conflicts=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(isinstance(plan, list) for plan in plans.values())} plan(s) généré(s) en {elapsed:.1f} s"
+            + (f", {len(rows)} jour(s) enregistré(s)." if options['save'] else ".")
+        ))
@@ -0,0 +1,11 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from patients.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche des patients (FTS5 sous SQLite, trigrammes sous PostgreSQL)."
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index(get_user_model().objects.all())
+        self.stdout.write(self.style.SUCCESS(f"{count} patient(s) indexé(s)."))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from patients.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Reconstruit entièrement le cumul des statistiques patients (PatientStatsRollup)."
+
+    def handle(self, *args, **options):
+        rollup = rebuild_stats()
+        self.stdout.write(self.style.SUCCESS(f"Statistiques reconstruites : {rollup.patient_count} profil(s)."))
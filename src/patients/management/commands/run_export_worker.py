@@ -0,0 +1,75 @@
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from patients.exports import EXPORT_KINDS
+from patients.models import ExportJob
+
+
+class Command(BaseCommand):
+    help = "Worker local : génère les exports en attente (ExportJob) hors des workers web."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Traite la file puis s'arrête.")
+        parser.add_argument('--interval', type=float, default=2.0, help="Pause (s) entre deux scrutations.")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Worker d'export démarré.")
+        while True:
+            processed = self.process_pending()
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(options['interval'])
+
+    def process_pending(self):
+        processed = 0
+        for job_id in ExportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True):
+            # Réservation atomique : un seul worker traite le job
+            if not ExportJob.objects.filter(pk=job_id, status='pending').update(status='running'):
+                continue
+            self.run_job(ExportJob.objects.get(pk=job_id))
+            processed += 1
+        return processed
+
+    def run_job(self, job):
+        exporter = EXPORT_KINDS.get(job.kind)
+        if exporter is None:
+            self.fail(job, f"Type d'export inconnu : {job.kind}")
+            return
+
+        def report(done, total):
+            if total:
+                ExportJob.objects.filter(pk=job.pk).update(progress=min(99, done * 100 // total))
+
+        try:
+            with tempfile.TemporaryFile() as output:
+                exporter['writer'](job.params, output, progress=report)
+                output.seek(0)
+                job.file.save(f"{job.id}-{exporter['filename']}", File(output), save=False)
+        except Exception as e:
+            self.fail(job, str(e))
+            return
+
+        # Si les données ont changé pendant la génération, le job a été marqué
+        # "expired" par le signal : on ne le repasse pas en "done"
+        finished = ExportJob.objects.filter(pk=job.pk, status='running').update(
+            file=job.file.name, status='done', progress=100, finished_at=timezone.now()
+        )
+        if not finished:
+            job.file.delete(save=False)
+            self.stdout.write(f"Export {job.id} périmé pendant la génération.")
+            return
+
+        # Les anciennes versions périmées du même export ne servent plus
+        for old in ExportJob.objects.filter(cache_key=job.cache_key, status__in=['expired', 'failed']):
+            old.file.delete(save=False)
+            old.delete()
+
+        self.stdout.write(self.style.SUCCESS(f"Export {job.id} terminé."))
+
+    def fail(self, job, error):
+        ExportJob.objects.filter(pk=job.pk).update(status='failed', error=error, finished_at=timezone.now())
+        self.stderr.write(f"Export {job.id} en échec : {error}")
@@ -0,0 +1,90 @@
+from django.db import transaction
+from .energy import ENERGY_COLUMNS, profile_energy_requirements
+from .models import MealPlan, MealPlanTemplate, MealPlanTemplateDay, PatientProfile
+from .planner import DEFAULT_KCAL, DEFAULT_TIME_BUDGET, excluded_tags, generate_plans
+
+# -----------------------------
+# Plans alimentaires : brouillons générés à partir du profil
+# (cible calorique = besoin énergétique total, exclusions = allergies et antécédents)
+# -----------------------------
+
+
+def plan_request(profile, requirements):
+    energy = requirements.get(str(profile.user_id))
+    kcal = energy['tee'] if energy else DEFAULT_KCAL
+    # Graine fixe par patient : deux générations successives donnent le même brouillon
+    return kcal, excluded_tags(profile.allergies, profile.medical_history), profile.user_id.int % (2 ** 32)
+
+
+def draft_meal_plans(user_ids, time_budget=DEFAULT_TIME_BUDGET, workers=None):
+    """
+    {user_id: plan} calculés en parallèle dans le pool de processus (None en cas d'échec).
+    workers : pool dédié pour les traitements par lots (voir planner.generate_plans).
+    """
+    # Besoins calculés depuis les seuls profils demandés (pas de calcul de la patientèle)
+    profiles = list(PatientProfile.objects.filter(user_id__in=user_ids).only('allergies', 'medical_history', *ENERGY_COLUMNS))
+    requirements = profile_energy_requirements(profiles)
+    requests = {profile.user_id: plan_request(profile, requirements) for profile in profiles}
+    return generate_plans(requests, time_budget, workers)
+
+
+# -----------------------------
+# Enregistrement groupé et modèles de plans
+# Upsert sur la contrainte unique (patient, jour) : un INSERT ... ON CONFLICT
+# par lot au lieu d'un save() (SELECT + UPDATE/INSERT) par journée.
+# -----------------------------
+UPSERT_BATCH_SIZE = 1000
+
+
+def upsert_meal_plans(plans):
+    """Crée ou remplace les journées (patient, jour) données, en quelques requêtes."""
+    return MealPlan.objects.bulk_create(
+        plans,
+        batch_size=UPSERT_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['patient', 'day'],
+        update_fields=MealPlan.MEAL_FIELDS,
+    )
+
+
+def save_meal_plans(plans):
+    """
+    Journées issues d'un formulaire : les nouvelles par upsert (patient, jour),
+    les existantes (jour inchangé) par un bulk_update sur leur clé primaire.
+    """
+    with transaction.atomic():
+        upsert_meal_plans([plan for plan in plans if plan._state.adding])
+        MealPlan.objects.bulk_update(
+            [plan for plan in plans if not plan._state.adding], MealPlan.MEAL_FIELDS, batch_size=UPSERT_BATCH_SIZE
+        )
+
+
+def assign_template(template, patient_ids, replace=False):
+    """
+    Attribue un modèle à plusieurs patients dans une seule transaction.
+    replace=True supprime en plus les journées des patients absentes du modèle.
+    Retourne le nombre de journées écrites.
+    """
+    days = list(template.days.all())
+    patient_ids = list(patient_ids)
+    plans = [
+        MealPlan(patient_id=patient_id, day=day.day, **day.meals())
+        for patient_id in patient_ids
+        for day in days
+    ]
+    with transaction.atomic():
+        if replace:
+            MealPlan.objects.filter(patient_id__in=patient_ids).exclude(day__in=[day.day for day in days]).delete()
+        upsert_meal_plans(plans)
+    return len(plans)
+
+
+def template_from_patient(patient, name, created_by=None, description=''):
+    """Nouveau modèle copié du plan actuel d'un patient."""
+    with transaction.atomic():
+        template = MealPlanTemplate.objects.create(name=name, description=description, created_by=created_by)
+        MealPlanTemplateDay.objects.bulk_create([
+            MealPlanTemplateDay(template=template, day=plan.day, **plan.meals())
+            for plan in patient.meal_plans.all()
+        ])
+    return template
@@ -1,28 +1,37 @@
 from django.shortcuts import redirect
 from django.urls import reverse
+from .models import PatientProfile
+
+# Marqueur posé en session une fois le profil vérifié complet (supprimé par
+# le signal post_save de PatientProfile, voir patients/signals.py)
+PROFILE_COMPLETE_SESSION_KEY = '_profile_complete'
+
 
 class ProfileCompletionMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        # Liste blanche calculée une seule fois au démarrage
+        self.allowed_urls = frozenset([
+            reverse('complete_profile'),
+            reverse('account_logout'),
+            reverse('home'), # Ajoute 'home' ici pour laisser la vue pivot travailler
+            '/i18n/',
+        ])
 
     def __call__(self, request):
-        if request.user.is_authenticated:
-            # 1. On laisse passer les diététiciens sans condition
-            if request.user.role == 'dietitian':
-                return self.get_response(request)
+        # 0. Fichiers statiques : on ne touche ni à la session ni à l'utilisateur
+        if request.path.startswith('/static/'):
+            return self.get_response(request)
 
-            # 2. On vérifie seulement les patients
-            if request.user.role == 'patient':
-                allowed_urls = [
-                    reverse('complete_profile'),
-                    reverse('account_logout'),
-                    reverse('home'), # Ajoute 'home' ici pour laisser la vue pivot travailler
-                    '/i18n/',
-                ]
-                
-                # Vérification du profil
-                has_profile = hasattr(request.user, 'profile') and request.user.profile.age
-                if not has_profile and request.path not in allowed_urls and not request.path.startswith('/static/'):
+        user = request.user
+        # 1. On laisse passer les diététiciens sans condition
+        # 2. On vérifie seulement les patients
+        if user.is_authenticated and user.role == 'patient':
+            # Profil déjà validé pour cette session : aucune requête supplémentaire
+            if not request.session.get(PROFILE_COMPLETE_SESSION_KEY) and request.path not in self.allowed_urls:
+                if PatientProfile.objects.filter(user_id=user.pk, age__gt=0).exists():
+                    request.session[PROFILE_COMPLETE_SESSION_KEY] = True
+                else:
                     return redirect('complete_profile')
 
-        return self.get_response(request)
\ No newline at end of file
+        return self.get_response(request)
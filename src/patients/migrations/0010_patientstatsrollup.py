@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0009_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientStatsRollup',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, editable=False, primary_key=True, serialize=False)),
+                ('patient_count', models.IntegerField(default=0)),
+                ('gender_counts', models.JSONField(default=dict)),
+                ('allergy_counts', models.JSONField(default=dict)),
+                ('activity_counts', models.JSONField(default=dict)),
+                ('occupation_counts', models.JSONField(default=dict)),
+                ('age_sum', models.FloatField(default=0)),
+                ('age_n', models.IntegerField(default=0)),
+                ('weight_sum', models.FloatField(default=0)),
+                ('weight_n', models.IntegerField(default=0)),
+                ('height_sum', models.FloatField(default=0)),
+                ('height_n', models.IntegerField(default=0)),
+                ('bmi_sum', models.FloatField(default=0)),
+                ('bmi_n', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
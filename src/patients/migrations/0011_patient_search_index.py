@@ -0,0 +1,75 @@
+import unicodedata
+
+from django.db import migrations
+
+# Copie figée de patients.search au moment de la migration : elle ne doit pas
+# changer si le module évolue ensuite.
+SEARCH_TABLE = 'patients_patientsearch'
+SEARCH_VOCAB_TABLE = 'patients_patientsearch_vocab'
+BATCH_SIZE = 2000
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def create_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "user_id UNINDEXED, document, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_VOCAB_TABLE} USING fts5vocab({SEARCH_TABLE}, 'row')"
+        )
+        insert = f"INSERT INTO {SEARCH_TABLE} (user_id, document) VALUES (%s, %s)"
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "user_id uuid PRIMARY KEY REFERENCES users_customuser(id) ON DELETE CASCADE, document text NOT NULL)"
+        )
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_TABLE}_trgm ON {SEARCH_TABLE} USING gin (document gin_trgm_ops)"
+        )
+        insert = f"INSERT INTO {SEARCH_TABLE} (user_id, document) VALUES (%s, %s) ON CONFLICT (user_id) DO NOTHING"
+    else:
+        return
+
+    # Indexation des patients existants, par lots
+    CustomUser = apps.get_model('users', 'CustomUser')
+    patients = CustomUser.objects.using(connection.alias).filter(role='patient').values_list(
+        'id', 'first_name', 'last_name', 'email'
+    )
+    rows = []
+    with connection.cursor() as cursor:
+        for pk, first_name, last_name, email in patients.iterator(chunk_size=BATCH_SIZE):
+            user_id = pk.hex if connection.vendor == 'sqlite' else pk
+            rows.append((user_id, normalize(' '.join([first_name, last_name, email]))))
+            if len(rows) == BATCH_SIZE:
+                cursor.executemany(insert, rows)
+                rows = []
+        if rows:
+            cursor.executemany(insert, rows)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_VOCAB_TABLE}")
+    if vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0010_patientstatsrollup'),
+        ('users', '0003_usersession'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0011_patient_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultation',
+            name='bmi',
+            field=models.FloatField(blank=True, editable=False, null=True, verbose_name='IMC'),
+        ),
+        migrations.AddField(
+            model_name='consultation',
+            name='bmi_class',
+            field=models.CharField(blank=True, choices=[('underweight', 'Insuffisance pondérale'), ('normal', 'Normal'), ('overweight', 'Surpoids'), ('obese', 'Obésité')], db_index=True, editable=False, max_length=12, verbose_name="Classe d'IMC"),
+        ),
+    ]
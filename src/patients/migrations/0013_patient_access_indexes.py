@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 10:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0012_consultation_bmi'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['patient', '-date_consultation', '-id'], name='consult_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultation',
+            index=models.Index(fields=['next_appointment'], name='consult_next_appt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fooddiary',
+            index=models.Index(fields=['patient', '-date', '-created_at', '-id'], name='food_patient_date_idx'),
+        ),
+    ]
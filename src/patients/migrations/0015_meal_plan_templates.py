@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 11:51
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0014_food_diary_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MealPlanTemplate',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100, verbose_name='Nom du modèle')),
+                ('description', models.TextField(blank=True, verbose_name='Description')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='meal_plan_templates', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MealPlanTemplateDay',
+            fields=[
+                ('day', models.CharField(choices=[('1', 'Jour 1'), ('2', 'Jour 2'), ('3', 'Jour 3'), ('4', 'Jour 4'), ('5', 'Jour 5'), ('6', 'Jour 6'), ('7', 'Jour 7')], max_length=1)),
+                ('breakfast', models.TextField(verbose_name='Petit-déjeuner')),
+                ('morning_snack', models.TextField(blank=True, verbose_name='Collation Matin')),
+                ('lunch', models.TextField(verbose_name='Déjeuner')),
+                ('afternoon_snack', models.TextField(blank=True, verbose_name='Collation Après-midi')),
+                ('dinner', models.TextField(verbose_name='Dîner')),
+                ('evening_snack', models.TextField(blank=True, verbose_name='Collation Soir')),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='patients.mealplantemplate')),
+            ],
+            options={
+                'ordering': ['day'],
+                'unique_together': {('template', 'day')},
+            },
+        ),
+    ]
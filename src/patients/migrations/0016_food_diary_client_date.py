@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 10:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0015_meal_plan_templates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fooddiary',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate, verbose_name='Date'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 13:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patients', '0016_food_diary_client_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultation',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import uuid
 
@@ -48,12 +49,42 @@ class PatientProfile(models.Model):
         if self.weight and self.height:
             h = self.height / 100 if self.height > 3 else self.height
             self.bmi = round(self.weight / (h * h), 2)
-        super().save(*args, **kwargs)
+        # pre_save et post_save dans la même transaction : le verrou du cumul
+        # statistique (patients.stats) est tenu de la lecture à l'application du delta
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return _("Profil de %(email)s") % {"email": self.user.email}
 
 
+# -----------------------------
+# Classes d'IMC (seuils OMS)
+# -----------------------------
+BMI_CLASSES = {
+    'underweight': {"label": _("Insuffisance pondérale"), "color": "info"},
+    'normal': {"label": _("Normal"), "color": "success"},
+    'overweight': {"label": _("Surpoids"), "color": "warning"},
+    'obese': {"label": _("Obésité"), "color": "danger"},
+}
+
+
+def body_mass_index(weight, height):
+    # Taille en cm ou en m
+    if weight and height:
+        h = height / 100 if height > 3 else height
+        return round(float(weight) / (h ** 2), 1)
+    return None
+
+
+def classify_bmi(value):
+    if not value: return None
+    if value < 18.5: return 'underweight'
+    if value < 25: return 'normal'
+    if value < 30: return 'overweight'
+    return 'obese'
+
+
 # -----------------------------
 # Consultation
 # -----------------------------
@@ -68,6 +99,8 @@ class Consultation(models.Model):
         limit_choices_to={'role': 'dietitian'}
     )
     date_consultation = models.DateField(auto_now_add=True, verbose_name=_("Date de consultation"))
+    # Départage les consultations du même jour (dernière consultation d'un patient)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     blood_pressure = models.CharField(max_length=20, blank=True, verbose_name=_("Tension artérielle"))
     total_cholesterol = models.FloatField(null=True, blank=True, verbose_name=_("Cholestérol total"))
@@ -83,21 +116,45 @@ class Consultation(models.Model):
 
     next_appointment = models.DateField(null=True, blank=True, verbose_name=_("Date de suivi"))
 
-    @property
-    def bmi(self):
-        if self.weight and self.patient_profile.height:
-            h = self.patient_profile.height / 100 if self.patient_profile.height > 3 else self.patient_profile.height
-            return round(self.weight / (h ** 2), 1)
-        return None
+    # IMC calculé à l'enregistrement (filtrable, triable et agrégeable en SQL)
+    bmi = models.FloatField(null=True, blank=True, editable=False, verbose_name=_("IMC"))
+    bmi_class = models.CharField(
+        max_length=12,
+        blank=True,
+        editable=False,
+        db_index=True,
+        choices=[(key, value['label']) for key, value in BMI_CLASSES.items()],
+        verbose_name=_("Classe d'IMC")
+    )
+
+    def patient_height(self):
+        # Taille du profil rattaché, sinon celle du profil actuel du patient
+        if self.patient_profile_id:
+            return self.patient_profile.height
+        return PatientProfile.objects.filter(user_id=self.patient_id).values_list('height', flat=True).first()
+
+    def compute_bmi(self, height):
+        self.bmi = body_mass_index(self.weight, height)
+        self.bmi_class = classify_bmi(self.bmi) or ''
+
+    def save(self, *args, **kwargs):
+        self.compute_bmi(self.patient_height())
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'weight' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'bmi', 'bmi_class'}
+        super().save(*args, **kwargs)
 
     @property
     def bmi_status(self):
-        val = self.bmi
-        if not val: return {"label": _("Inconnu"), "color": "secondary"}
-        if val < 18.5: return {"label": _("Insuffisance pondérale"), "color": "info"}
-        if val < 25: return {"label": _("Normal"), "color": "success"}
-        if val < 30: return {"label": _("Surpoids"), "color": "warning"}
-        return {"label": _("Obésité"), "color": "danger"}
+        return BMI_CLASSES.get(self.bmi_class, {"label": _("Inconnu"), "color": "secondary"})
+
+    class Meta:
+        indexes = [
+            # Historique d'un patient trié par date (dossier, pagination par curseur, graphique)
+            models.Index(fields=['patient', '-date_consultation', '-id'], name='consult_patient_date_idx'),
+            # Rendez-vous de suivi à venir
+            models.Index(fields=['next_appointment'], name='consult_next_appt_idx'),
+        ]
 
     def __str__(self):
         return _("Consultation de %(email)s - %(date)s") % {"email": self.patient.email, "date": self.date_consultation}
@@ -106,13 +163,14 @@ class Consultation(models.Model):
 # -----------------------------
 # Plan Alimentaire
 # -----------------------------
-class MealPlan(models.Model):
+class MealDay(models.Model):
+    """Contenu d'une journée de plan alimentaire (plan d'un patient ou modèle réutilisable)."""
     DAYS = [
         ('1', _('Jour 1')), ('2', _('Jour 2')), ('3', _('Jour 3')),
         ('4', _('Jour 4')), ('5', _('Jour 5')), ('6', _('Jour 6')), ('7', _('Jour 7'))
     ]
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='meal_plans')
+    MEAL_FIELDS = ['breakfast', 'morning_snack', 'lunch', 'afternoon_snack', 'dinner', 'evening_snack']
+
     day = models.CharField(max_length=1, choices=DAYS)
 
     breakfast = models.TextField(verbose_name=_("Petit-déjeuner"))
@@ -123,20 +181,62 @@ class MealPlan(models.Model):
     evening_snack = models.TextField(verbose_name=_("Collation Soir"), blank=True)
 
     class Meta:
-        unique_together = ['patient', 'day']
+        abstract = True
+
+    def meals(self):
+        return {field: getattr(self, field) for field in self.MEAL_FIELDS}
+
+
+class MealPlan(MealDay):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='meal_plans')
+
+    class Meta:
+        unique_together = ['patient', 'day']  # Sert aussi d'index pour "plans d'un patient triés par jour"
         ordering = ['day']
 
     def __str__(self):
         return _("Plan %(day)s - %(email)s") % {"day": self.get_day_display(), "email": self.patient.email}
 
 
+# -----------------------------
+# Modèles de plans alimentaires
+# Un même plan hebdomadaire attribué à plusieurs patients (voir mealplans.assign_template)
+# -----------------------------
+class MealPlanTemplate(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100, verbose_name=_("Nom du modèle"))
+    description = models.TextField(blank=True, verbose_name=_("Description"))
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='meal_plan_templates')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class MealPlanTemplateDay(MealDay):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    template = models.ForeignKey(MealPlanTemplate, on_delete=models.CASCADE, related_name='days')
+
+    class Meta:
+        unique_together = ['template', 'day']
+        ordering = ['day']
+
+    def __str__(self):
+        return f"{self.template.name} - {self.get_day_display()}"
+
+
 # -----------------------------
 # Journal Alimentaire
 # -----------------------------
 class FoodDiary(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='food_entries')
-    date = models.DateField(auto_now_add=True, verbose_name=_("Date"))
+    # Date du repas : fournie par la saisie groupée (hors ligne), aujourd'hui sinon
+    date = models.DateField(default=timezone.localdate, verbose_name=_("Date"))
     meal_time = models.CharField(
         max_length=20,
         choices=[
@@ -158,10 +258,129 @@ class FoodDiary(models.Model):
     class Meta:
         verbose_name = _("Plan alimentaire")
         ordering = ['-date'] # Pour que ça s'affiche du Jour 1 au Jour 7
+        indexes = [
+            # Journal d'un patient trié par date (pagination par curseur)
+            models.Index(fields=['patient', '-date', '-created_at', '-id'], name='food_patient_date_idx'),
+            # Synchronisation des clients hors ligne ("modifié depuis")
+            models.Index(fields=['patient', 'updated_at', 'id'], name='food_patient_updated_idx'),
+        ]
 
     def __str__(self):
         return _("%(email)s - %(date)s - %(meal)s") % {
             "email": self.patient.email,
             "date": self.date,
             "meal": self.get_meal_time_display()
-        }
\ No newline at end of file
+        }
+
+# -----------------------------
+# Repas supprimés (synchronisation hors ligne)
+# -----------------------------
+class FoodDiaryTombstone(models.Model):
+    """Trace d'un repas supprimé, pour que les clients hors ligne le retirent aussi."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    patient = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='food_tombstones')
+    entry_id = models.UUIDField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'deleted_at', 'id'], name='food_tomb_patient_del_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_id} ({self.deleted_at})"
+
+
+# -----------------------------
+# Exports en arrière-plan
+# -----------------------------
+class ExportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', _('En attente')),
+        ('running', _('En cours')),
+        ('done', _('Terminé')),
+        ('failed', _('Échec')),
+        ('expired', _('Périmé')),  # Les données ont changé depuis la génération
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='export_jobs')
+    kind = models.CharField(max_length=30, verbose_name=_("Type d'export"))
+    params = models.JSONField(default=dict, blank=True)
+    # Empreinte (type + paramètres) : deux exports identiques ont la même clé
+    cache_key = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', db_index=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    file = models.FileField(upload_to='exports/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.kind} - {self.get_status_display()} ({self.progress}%)"
+
+
+# -----------------------------
+# Statistiques agrégées (tableau de bord diététicienne)
+# -----------------------------
+class PatientStatsRollup(models.Model):
+    """
+    Ligne unique (pk=1) tenue à jour de façon incrémentale par les signaux
+    de PatientProfile (voir patients/stats.py). La page de statistiques
+    se résume ainsi à une lecture par clé primaire.
+    """
+    # Champ du profil -> attribut de comptage
+    COUNT_FIELDS = {
+        'gender': 'gender_counts',
+        'allergies': 'allergy_counts',
+        'activity_level': 'activity_counts',
+        'occupation': 'occupation_counts',
+    }
+    # Champs moyennés : on garde la somme et le nombre de valeurs non nulles
+    AVG_FIELDS = ['age', 'weight', 'height', 'bmi']
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1, editable=False)
+    patient_count = models.IntegerField(default=0)
+
+    gender_counts = models.JSONField(default=dict)
+    allergy_counts = models.JSONField(default=dict)
+    activity_counts = models.JSONField(default=dict)
+    occupation_counts = models.JSONField(default=dict)
+
+    age_sum = models.FloatField(default=0)
+    age_n = models.IntegerField(default=0)
+    weight_sum = models.FloatField(default=0)
+    weight_n = models.IntegerField(default=0)
+    height_sum = models.FloatField(default=0)
+    height_n = models.IntegerField(default=0)
+    bmi_sum = models.FloatField(default=0)
+    bmi_n = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def apply(self, values, sign):
+        """Ajoute (sign=1) ou retire (sign=-1) la contribution d'un profil."""
+        self.patient_count += sign
+        for field, attr in self.COUNT_FIELDS.items():
+            counts = getattr(self, attr)
+            key = str(values[field])  # Les clés JSON sont des chaînes
+            counts[key] = counts.get(key, 0) + sign
+            if counts[key] <= 0:
+                del counts[key]
+        for field in self.AVG_FIELDS:
+            if values[field] is not None:
+                setattr(self, f'{field}_sum', getattr(self, f'{field}_sum') + sign * values[field])
+                setattr(self, f'{field}_n', getattr(self, f'{field}_n') + sign)
+
+    def average(self, field):
+        n = getattr(self, f'{field}_n')
+        return getattr(self, f'{field}_sum') / n if n else None
+
+    @property
+    def averages(self):
+        return {f'avg_{field}': self.average(field) for field in self.AVG_FIELDS}
+
+    def __str__(self):
+        return _("Statistiques (%(count)s patients)") % {"count": self.patient_count}
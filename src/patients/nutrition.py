@@ -0,0 +1,163 @@
+import csv
+import hashlib
+import re
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from django.core.cache import cache
+from .text import normalize
+
+# -----------------------------
+# Analyse nutritionnelle du journal alimentaire
+# Les descriptions libres ("Pain complet, 2 œufs, 250 ml de lait écrémé") sont
+# comparées à une table de composition locale (data/food_composition.csv,
+# valeurs pour 100 g) par une seule expression régulière précompilée
+# regroupant tous les aliments (le plus long synonyme l'emporte).
+# -----------------------------
+FOOD_TABLE_PATH = Path(__file__).resolve().parent / 'data' / 'food_composition.csv'
+NUTRIENTS = ['kcal', 'proteines', 'glucides', 'lipides', 'fibres']
+NUTRITION_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# Mémoire locale au processus devant le cache partagé (les analyses ne changent qu'avec la table)
+LOCAL_MEMO_SIZE = 50000
+
+# Unités acceptées devant un aliment ("150 g de riz", "25 cl de jus") -> grammes
+UNITS = {'g': 1, 'gr': 1, 'gramme': 1, 'grammes': 1, 'kg': 1000, 'ml': 1, 'cl': 10, 'dl': 100, 'l': 1000}
+
+
+def normalize_text(text):
+    """Minuscules, sans accents ni ponctuation ; les décimales '1,5' deviennent '1.5'."""
+    text = normalize(text).replace('œ', 'oe').replace('æ', 'ae')
+    text = re.sub(r'(?<=\d),(?=\d)', '.', text)
+    return ' '.join(re.sub(r'[^\w.]+|(?<!\d)\.|\.(?!\d)', ' ', text).split())
+
+
+class FoodTable:
+
+    def __init__(self, path=FOOD_TABLE_PATH):
+        raw = Path(path).read_bytes()
+        self.version = hashlib.sha256(raw).hexdigest()[:12]
+
+        self.names = []
+        self.portions = []
+        self.per_gram = []  # Apports par gramme, dans l'ordre de NUTRIENTS
+        aliases = {}
+        for row in csv.DictReader(raw.decode('utf-8').splitlines(), delimiter=';'):
+            index = len(self.names)
+            self.names.append(row['aliment'])
+            self.portions.append(float(row['portion_g']))
+            self.per_gram.append(tuple(float(row[n]) / 100 for n in NUTRIENTS))
+            for alias in [row['aliment'], *row['synonymes'].split('|')]:
+                alias = normalize_text(alias)
+                if alias:
+                    aliases.setdefault(alias, index)
+        self.aliases = aliases
+
+        # Une seule passe sur le texte : négation ("sans sucre"), quantité et unité facultatives,
+        # puis l'aliment (synonymes triés du plus long au plus court, pluriel en s/x toléré)
+        foods = '|'.join(re.escape(alias) for alias in sorted(aliases, key=len, reverse=True))
+        units = '|'.join(sorted(UNITS, key=len, reverse=True))
+        self.matcher = re.compile(
+            rf'(?P<neg>\b(?:sans|ni|pas\s+de|pas\s+d)\s+)?'
+            rf'(?:\b(?P<qty>\d+(?:\.\d+)?)\s*(?P<unit>{units})?\s+(?:de\s+|d\s+)?)?'
+            rf'\b(?P<food>{foods})(?:s|x)?\b'
+        )
+
+    def analyze(self, description):
+        """Aliments reconnus et totaux d'une description (sans cache)."""
+        items = []
+        for match in self.matcher.finditer(normalize_text(description)):
+            if match['neg']:
+                continue
+            index = self.aliases[match['food']]
+            qty = float(match['qty']) if match['qty'] else 1
+            grams = qty * UNITS[match['unit']] if match['unit'] else qty * self.portions[index]
+            items.append((index, grams))
+
+        # Totaux colonne par colonne : somme des (grammes x apports par gramme)
+        contributions = [[grams * value for value in self.per_gram[index]] for index, grams in items]
+        totals = [round(sum(column), 1) for column in zip(*contributions)] or [0.0] * len(NUTRIENTS)
+        return {
+            **dict(zip(NUTRIENTS, totals)),
+            'items': [[self.names[index], round(grams)] for index, grams in items],
+        }
+
+
+@lru_cache(maxsize=1)
+def food_table():
+    # Chargée et compilée une fois par processus
+    return FoodTable()
+
+
+def nutrition_cache_key(table, description):
+    digest = hashlib.sha256(normalize_text(description).encode()).hexdigest()
+    return f'nutrition:{table.version}:{digest}'
+
+
+_local_memo = {}
+
+
+def analyze_descriptions(descriptions):
+    """
+    {description: analyse} pour une liste de descriptions. Clé = empreinte de la
+    description normalisée et version de la table. Ordre de lecture : mémoire du
+    processus, puis cache partagé (interrogé en une fois), puis analyse.
+    """
+    table = food_table()
+    keys = {description: nutrition_cache_key(table, description) for description in set(descriptions)}
+
+    results, remote = {}, {}
+    for description, key in keys.items():
+        if key in _local_memo:
+            results[description] = _local_memo[key]
+        else:
+            remote[description] = key
+
+    if remote:
+        cached = cache.get_many(remote.values())
+        missing = {}
+        for description, key in remote.items():
+            if key in cached:
+                results[description] = cached[key]
+            else:
+                results[description] = missing[key] = table.analyze(description)
+        if missing:
+            cache.set_many(missing, NUTRITION_CACHE_TIMEOUT)
+
+        if len(_local_memo) + len(remote) > LOCAL_MEMO_SIZE:
+            _local_memo.clear()
+        _local_memo.update((key, results[description]) for description, key in remote.items())
+    return results
+
+
+def attach_nutrients(entries):
+    """Ajoute `entry.nutrients` à chaque repas (pages du journal)."""
+    entries = list(entries)
+    analyses = analyze_descriptions([entry.description for entry in entries])
+    for entry in entries:
+        entry.nutrients = analyses[entry.description]
+    return entries
+
+
+def patient_nutrition(patient, start=None, end=None):
+    """Totaux par repas et par jour du journal d'un patient (une requête, colonnes utiles)."""
+    entries = patient.food_entries.all()
+    if start:
+        entries = entries.filter(date__gte=start)
+    if end:
+        entries = entries.filter(date__lte=end)
+    rows = list(entries.order_by('date', 'created_at').values_list('id', 'date', 'meal_time', 'description'))
+    analyses = analyze_descriptions([row[3] for row in rows])
+
+    days = defaultdict(lambda: [0.0] * len(NUTRIENTS))
+    meals = []
+    for entry_id, day, meal_time, description in rows:
+        analysis = analyses[description]
+        values = [analysis[n] for n in NUTRIENTS]
+        days[day] = [total + value for total, value in zip(days[day], values)]
+        meals.append({'id': str(entry_id), 'date': day.isoformat(), 'meal_time': meal_time, **analysis})
+
+    return {
+        'nutrients': NUTRIENTS,
+        'days': [[day.isoformat(), *[round(v, 1) for v in totals]] for day, totals in sorted(days.items())],
+        'entries': meals,
+    }
@@ -0,0 +1,112 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# -----------------------------
+# Pagination par curseur (keyset)
+# Au lieu de OFFSET n (qui relit les n premières lignes) on filtre "après la
+# dernière ligne vue" sur une clé de tri unique : le coût d'une page ne dépend
+# plus de sa profondeur, et aucun COUNT(*) n'est nécessaire.
+# -----------------------------
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, cursor, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.cursor = cursor                    # Jeton de la page courante ('' pour la première)
+        self.next_cursor = next_cursor          # None s'il n'y a pas de page suivante
+        self.previous_cursor = previous_cursor  # None s'il n'y a pas de page précédente
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class CursorPaginator:
+    """
+    ordering : champs de tri, le dernier devant être unique (ex. ('-date_consultation', '-id')).
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+
+    # --- Jetons ---
+    def encode_cursor(self, obj, direction):
+        values = [self.queryset.model._meta.get_field(field).value_to_string(obj) for field in self.fields]
+        payload = json.dumps({'d': direction, 'k': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        """Retourne (direction, valeurs) ; un jeton invalide ramène à la première page."""
+        if not cursor:
+            return 'n', None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            direction, raw = payload['d'], payload['k']
+            if direction not in ('n', 'p') or len(raw) != len(self.fields):
+                raise ValueError
+            meta = self.queryset.model._meta
+            return direction, [meta.get_field(field).to_python(value) for field, value in zip(self.fields, raw)]
+        except (ValueError, KeyError, TypeError, binascii.Error, ValidationError):
+            return 'n', None
+
+    # --- Requêtes ---
+    def _after(self, values, backwards):
+        """Lignes situées après `values` dans l'ordre de tri (ou avant si backwards)."""
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = self.fields[i]
+            descending = field.startswith('-') != backwards
+            step = Q(**{f"{name}__{'lt' if descending else 'gt'}": values[i]})
+            for previous, value in zip(self.fields[:i], values[:i]):
+                step &= Q(**{previous: value})
+            condition |= step
+        return condition
+
+    def get_page(self, cursor=None):
+        direction, values = self.decode_cursor(cursor)
+        backwards = direction == 'p'
+
+        ordering = self.ordering
+        if backwards:
+            ordering = [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+        rows = self.queryset.order_by(*ordering)
+        if values is not None:
+            rows = rows.filter(self._after(values, backwards))
+
+        # Une ligne de plus pour savoir s'il reste une page dans ce sens
+        rows = list(rows[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        has_next = has_more if not backwards else values is not None
+        has_previous = has_more if backwards else values is not None
+        return CursorPage(
+            rows,
+            cursor if values is not None else '',
+            self.encode_cursor(rows[-1], 'n') if rows and has_next else None,
+            self.encode_cursor(rows[0], 'p') if rows and has_previous else None,
+        )
@@ -0,0 +1,273 @@
+import csv
+import math
+import multiprocessing
+import random
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, TimeoutError
+from functools import lru_cache
+from pathlib import Path
+from .text import normalize
+
+# -----------------------------
+# Générateur de plans alimentaires (7 jours, petit-déjeuner -> collation du soir)
+# Recherche locale (recuit simulé) sur un catalogue de plats local
+# (data/meal_catalogue.csv) : on vise l'apport calorique et la répartition des
+# macronutriments en excluant les plats incompatibles avec le profil.
+# Le calcul, purement CPU, tourne dans un pool de processus avec un budget de
+# temps ; ce module n'importe pas Django pour que les processus démarrent vite.
+# -----------------------------
+CATALOGUE_PATH = Path(__file__).resolve().parent / 'data' / 'meal_catalogue.csv'
+
+SLOTS = ['breakfast', 'morning_snack', 'lunch', 'afternoon_snack', 'dinner', 'evening_snack']
+SLOT_KINDS = {
+    'breakfast': 'petit_dejeuner',
+    'morning_snack': 'collation',
+    'lunch': 'repas',
+    'afternoon_snack': 'collation',
+    'dinner': 'repas',
+    'evening_snack': 'collation',
+}
+# Part de l'apport quotidien par repas
+SLOT_SHARES = {
+    'breakfast': 0.25, 'morning_snack': 0.05, 'lunch': 0.35,
+    'afternoon_snack': 0.05, 'dinner': 0.25, 'evening_snack': 0.05,
+}
+# Répartition énergétique des macronutriments (kcal/g : 4, 4, 9)
+MACRO_SHARES = {'proteines': (0.20, 4), 'glucides': (0.50, 4), 'lipides': (0.30, 9)}
+NUTRIENTS = ['kcal', 'proteines', 'glucides', 'lipides']
+DAYS = 7
+
+DEFAULT_KCAL = 2000
+VARIETY_WEIGHT = 0.1
+DEFAULT_TIME_BUDGET = 1.5  # secondes par plan
+
+# Mots-clés des antécédents médicaux -> catégories de plats exclues
+EXCLUSION_KEYWORDS = {
+    'diabet': ['sucre'],
+    'hypertension': ['sel'],
+    'hta': ['sel'],
+    'insuffisance renale': ['sel'],
+    'arachide': ['arachide'],
+    'cacahuete': ['arachide'],
+    'lactose': ['lactose'],
+    'gluten': ['gluten'],
+    'coeliaqu': ['gluten'],
+    'oeuf': ['oeuf'],
+    'poisson': ['poisson'],
+    'crustace': ['fruits_de_mer'],
+    'fruits de mer': ['fruits_de_mer'],
+    'crevette': ['fruits_de_mer'],
+    'porc': ['porc'],
+    'halal': ['porc'],
+    'vegetarien': ['viande', 'porc', 'poisson', 'fruits_de_mer'],
+    'vegan': ['viande', 'porc', 'poisson', 'fruits_de_mer', 'oeuf', 'lactose'],
+    'goutte': ['fruits_de_mer', 'alcool'],
+    'alcool': ['alcool'],
+}
+ALLERGEN_TAGS = {'arachide', 'lactose', 'gluten', 'oeuf', 'poisson', 'fruits_de_mer'}
+# Allergie signalée sans précision : on écarte les allergènes les plus graves
+DEFAULT_ALLERGY_EXCLUSIONS = {'arachide', 'fruits_de_mer'}
+
+
+@lru_cache(maxsize=1)
+def load_catalogue(path=CATALOGUE_PATH):
+    """[(plat, type de repas, {exclusions}, (kcal, protéines, glucides, lipides)), ...]"""
+    with open(path, encoding='utf-8') as f:
+        return [
+            (
+                row['plat'],
+                row['repas'],
+                frozenset(tag for tag in row['exclusions'].split('|') if tag),
+                tuple(float(row[n]) for n in NUTRIENTS),
+            )
+            for row in csv.DictReader(f, delimiter=';')
+        ]
+
+
+def excluded_tags(allergies, medical_history):
+    """Catégories à exclure d'après le drapeau d'allergie et les antécédents (texte libre)."""
+    text = normalize(medical_history or '').replace('œ', 'oe')
+    tags = set()
+    for keyword, keyword_tags in EXCLUSION_KEYWORDS.items():
+        if keyword in text:
+            tags.update(keyword_tags)
+    if allergies and not tags & ALLERGEN_TAGS:
+        tags |= DEFAULT_ALLERGY_EXCLUSIONS
+    return sorted(tags)
+
+
+def daily_targets(kcal):
+    targets = {'kcal': kcal}
+    for nutrient, (share, kcal_per_gram) in MACRO_SHARES.items():
+        targets[nutrient] = kcal * share / kcal_per_gram
+    return targets
+
+
+# --- Optimisation (exécutée dans les processus du pool) ---
+def _day_cost(day, candidates, targets, slot_targets):
+    totals = [0.0] * len(NUTRIENTS)
+    cost = 0.0
+    for slot, choice in zip(SLOTS, day):
+        values = candidates[slot][choice][1]
+        for i, value in enumerate(values):
+            totals[i] += value
+        # Chaque repas proche de sa part de l'apport quotidien
+        cost += 0.5 * ((values[0] - slot_targets[slot]) / targets['kcal']) ** 2
+    # Écart relatif au carré : calories pondérées deux fois plus que les macronutriments
+    for i, nutrient in enumerate(NUTRIENTS):
+        weight = 2.0 if nutrient == 'kcal' else 1.0
+        cost += weight * ((totals[i] - targets[nutrient]) / targets[nutrient]) ** 2
+    return cost
+
+
+def _variety_cost(week):
+    # Pénalité par paire de repas identiques dans la semaine (déjeuner et dîner comptent ensemble)
+    counts = {}
+    for day in week:
+        for slot, choice in zip(SLOTS, day):
+            key = (SLOT_KINDS[slot], choice)
+            counts[key] = counts.get(key, 0) + 1
+    return VARIETY_WEIGHT * sum(n * (n - 1) / 2 for n in counts.values())
+
+
+def optimize_week(kcal, excluded, time_budget=DEFAULT_TIME_BUDGET, seed=None):
+    """
+    Plan de 7 jours : liste de 7 dicts {repas: (plat, (kcal, P, G, L))}.
+    Recuit simulé interrompu à l'expiration du budget : on renvoie le meilleur plan trouvé.
+    """
+    rng = random.Random(seed)
+    excluded = set(excluded)
+    catalogue = load_catalogue()
+    by_kind = {}
+    for name, kind, tags, values in catalogue:
+        if not tags & excluded:
+            by_kind.setdefault(kind, []).append((name, values))
+    # Déjeuner et dîner partagent les mêmes plats : les indices doivent être comparables
+    candidates = {slot: by_kind.get(SLOT_KINDS[slot], []) for slot in SLOTS}
+    if any(not options for options in candidates.values()):
+        raise ValueError("Aucun plat compatible pour au moins un repas.")
+
+    targets = daily_targets(kcal)
+    slot_targets = {slot: kcal * share for slot, share in SLOT_SHARES.items()}
+
+    week = [[rng.randrange(len(candidates[slot])) for slot in SLOTS] for _ in range(DAYS)]
+    day_costs = [_day_cost(day, candidates, targets, slot_targets) for day in week]
+    cost = sum(day_costs) + _variety_cost(week)
+    best, best_cost = [day[:] for day in week], cost
+
+    deadline = time.monotonic() + time_budget
+    temperature, iteration = 0.05, 0
+    while True:
+        iteration += 1
+        if iteration % 256 == 0:
+            if time.monotonic() >= deadline:
+                break
+            temperature = max(temperature * 0.97, 1e-5)
+
+        # Voisin : un plat d'un repas d'un jour remplacé au hasard
+        d, s = rng.randrange(DAYS), rng.randrange(len(SLOTS))
+        previous = week[d][s]
+        week[d][s] = rng.randrange(len(candidates[SLOTS[s]]))
+        new_day_cost = _day_cost(week[d], candidates, targets, slot_targets)
+        new_cost = cost - day_costs[d] + new_day_cost + _variety_cost_delta(week, d, s, previous)
+
+        if new_cost <= cost or rng.random() < math.exp((cost - new_cost) / temperature):
+            cost, day_costs[d] = new_cost, new_day_cost
+            if cost < best_cost:
+                best, best_cost = [day[:] for day in week], cost
+        else:
+            week[d][s] = previous
+
+    return [
+        {slot: candidates[slot][choice] for slot, choice in zip(SLOTS, day)}
+        for day in best
+    ]
+
+
+def _variety_cost_delta(week, d, s, previous):
+    # Variation de la pénalité quand week[d][s] passe de `previous` à sa valeur actuelle
+    kind, current = SLOT_KINDS[SLOTS[s]], week[d][s]
+    if current == previous:
+        return 0.0
+    others = [
+        week[i][j] for i in range(DAYS) for j, slot in enumerate(SLOTS)
+        if SLOT_KINDS[slot] == kind and (i, j) != (d, s)
+    ]
+    return VARIETY_WEIGHT * (others.count(current) - others.count(previous))
+
+
+# --- Pool de processus ---
+# Pool partagé par les requêtes web : volontairement petit, chaque worker web
+# (gunicorn, etc.) a le sien. Les traitements par lots (generate_meal_plans)
+# utilisent un pool dédié à leur taille.
+POOL_WORKERS = 2
+# Délai de garde au-delà du budget de calcul (démarrage des processus)
+STARTUP_GRACE = 5
+# Résultat d'un calcul interrompu (délai dépassé, pool indisponible) : à réessayer,
+# contrairement à None (aucun plan compatible avec le profil)
+PLAN_TIMEOUT = 'timeout'
+_executor = None
+
+
+def new_executor(workers):
+    # spawn : pas de copie des connexions ni des verrous du processus web
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = new_executor(POOL_WORKERS)
+    return _executor
+
+
+def generate_plans(requests, time_budget=DEFAULT_TIME_BUDGET, workers=None):
+    """
+    requests : {clé: (kcal, exclusions, graine)} ; les plans sont calculés en parallèle.
+    workers : taille d'un pool dédié, fermé à la fin (sinon pool partagé de POOL_WORKERS).
+    Retourne {clé: plan} : None si aucun plan n'est possible (catalogue vide après
+    exclusions), PLAN_TIMEOUT si le calcul n'a pas abouti à temps.
+    """
+    if workers:
+        with new_executor(workers) as executor:
+            return _collect_plans(executor, workers, requests, time_budget)
+    return _collect_plans(get_executor(), POOL_WORKERS, requests, time_budget)
+
+
+def _collect_plans(executor, workers, requests, time_budget):
+    futures = {
+        key: executor.submit(optimize_week, kcal, excluded, time_budget, seed)
+        for key, (kcal, excluded, seed) in requests.items()
+    }
+    deadline = time.monotonic() + time_budget * math.ceil(len(futures) / workers) + STARTUP_GRACE
+    plans = {}
+    for key, future in futures.items():
+        try:
+            plans[key] = future.result(timeout=max(0, deadline - time.monotonic()))
+        except TimeoutError:
+            future.cancel()
+            plans[key] = PLAN_TIMEOUT
+        except ValueError:
+            plans[key] = None
+        except BrokenExecutor:
+            # Processus du pool tué (mémoire, signal) : un nouveau pool sera créé au prochain appel
+            global _executor
+            if executor is _executor:
+                _executor = None
+            plans[key] = PLAN_TIMEOUT
+    return plans
+
+
+def plan_to_initial(plan):
+    """Plan -> données initiales du formset de MealPlan (un dict par jour)."""
+    return [
+        {'day': str(day), **{slot: f"{name} (≈ {values[0]:.0f} kcal)" for slot, (name, values) in meals.items()}}
+        for day, meals in enumerate(plan, start=1)
+    ]
+
+
+def plan_totals(plan):
+    return [
+        [round(sum(values[i] for _, values in meals.values())) for i in range(len(NUTRIENTS))]
+        for meals in plan
+    ]
@@ -0,0 +1,186 @@
+import difflib
+import re
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from .text import normalize
+
+# -----------------------------
+# Index de recherche des patients
+# SQLite : table virtuelle FTS5 ; PostgreSQL : table + index GIN trigrammes (pg_trgm).
+# Les textes sont normalisés côté Python (minuscules, sans accents) avant indexation.
+# Les tables sont créées (et remplies) par la migration 0011_patient_search_index.
+# -----------------------------
+SEARCH_TABLE = 'patients_patientsearch'
+SEARCH_VOCAB_TABLE = 'patients_patientsearch_vocab'
+
+# Nombre maximum de résultats classés par pertinence (liste du tableau de bord uniquement)
+SEARCH_LIMIT = 500
+# Seuil de similarité pour la tolérance aux fautes de frappe
+TYPO_CUTOFF = 0.75
+PG_SIMILARITY_THRESHOLD = 0.3
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def search_document(user):
+    return normalize(' '.join([user.first_name, user.last_name, user.email]))
+
+
+def search_backend():
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return connection.vendor
+    return None
+
+
+# --- Synchronisation (signaux post_save / post_delete sur CustomUser) ---
+def index_patient(user):
+    backend = search_backend()
+    if backend is None:
+        return
+    # Seuls les patients sont indexés (un changement de rôle retire l'entrée)
+    if user.role != 'patient':
+        unindex_patient(user.pk)
+        return
+
+    with connection.cursor() as cursor:
+        if backend == 'sqlite':
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE user_id = %s", [user.pk.hex])
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} (user_id, document) VALUES (%s, %s)", [user.pk.hex, search_document(user)])
+        else:
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (user_id, document) VALUES (%s, %s) "
+                "ON CONFLICT (user_id) DO UPDATE SET document = EXCLUDED.document",
+                [user.pk, search_document(user)]
+            )
+
+
+def unindex_patient(user_id):
+    backend = search_backend()
+    if backend is None:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE user_id = %s", [user_id.hex if backend == 'sqlite' else user_id])
+
+
+def rebuild_search_index(users):
+    """Réindexe tous les patients (commande rebuild_patient_search)."""
+    backend = search_backend()
+    if backend is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    count = 0
+    for user in users.filter(role='patient').only('id', 'first_name', 'last_name', 'email', 'role').iterator(chunk_size=2000):
+        index_patient(user)
+        count += 1
+    return count
+
+
+# --- Recherche ---
+def _fts_query(cursor, tokens):
+    """
+    Requête FTS5 : chaque mot est cherché en préfixe (mot*) et, s'il est assez
+    long, élargi aux termes proches du vocabulaire indexé (fautes de frappe).
+    """
+    clauses = []
+    for token in tokens:
+        variants = [f'"{token}"*']
+        if len(token) >= 4:
+            cursor.execute(
+                f"SELECT term FROM {SEARCH_VOCAB_TABLE} WHERE term >= %s AND term < %s",
+                [token[0], chr(ord(token[0]) + 1)]
+            )
+            terms = [row[0] for row in cursor.fetchall()]
+            variants += [f'"{term}"' for term in difflib.get_close_matches(token, terms, n=3, cutoff=TYPO_CUTOFF)]
+        clauses.append('(' + ' OR '.join(variants) + ')')
+    return ' AND '.join(clauses)
+
+
+@contextmanager
+def trigram_threshold():
+    """
+    Transaction dans laquelle l'opérateur <% de PostgreSQL utilise
+    PG_SIMILARITY_THRESHOLD : set_config(..., true) équivaut à SET LOCAL, le
+    seuil disparaît avec la transaction. Toute requête qui utilise
+    patient_search_filter doit s'exécuter dans ce bloc (sans effet ailleurs).
+    """
+    with transaction.atomic():
+        if search_backend() == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", [str(PG_SIMILARITY_THRESHOLD)]
+                )
+        yield
+
+
+def search_patient_ids(search_query, limit=SEARCH_LIMIT):
+    """Identifiants des patients correspondant à la recherche, du plus au moins pertinent."""
+    backend = search_backend()
+    tokens = TOKEN_RE.findall(normalize(search_query))
+    if backend is None or not tokens:
+        return None
+
+    with trigram_threshold(), connection.cursor() as cursor:
+        if backend == 'sqlite':
+            cursor.execute(
+                f"SELECT user_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s ORDER BY rank LIMIT %s",
+                [_fts_query(cursor, tokens), limit]
+            )
+        else:
+            # Opérateur <% (similarité de mots, servi par l'index GIN) : préfixes et fautes de frappe
+            query = ' '.join(tokens)
+            cursor.execute(
+                f"SELECT user_id FROM {SEARCH_TABLE} WHERE %s <%% document "
+                "ORDER BY word_similarity(%s, document) DESC LIMIT %s",
+                [query, query, limit]
+            )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_subquery(search_query):
+    """
+    Sous-requête SQL (non limitée, non triée) des patients correspondant à la
+    recherche, pour les filtres : export, compteurs. None sans index de recherche.
+    Sur PostgreSQL, à exécuter dans trigram_threshold().
+    """
+    backend = search_backend()
+    tokens = TOKEN_RE.findall(normalize(search_query))
+    if backend is None or not tokens:
+        return None
+
+    if backend == 'sqlite':
+        with connection.cursor() as cursor:
+            match = _fts_query(cursor, tokens)
+        return RawSQL(f"SELECT user_id FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s", [match])
+    # Même opérateur indexé que search_patient_ids (index GIN)
+    return RawSQL(f"SELECT user_id FROM {SEARCH_TABLE} WHERE %s <%% document", [' '.join(tokens)])
+
+
+def icontains_filter(search_query):
+    # Recherche simple (sans index), utilisée si la base n'a pas d'index de recherche
+    return (
+        Q(first_name__icontains=search_query) |
+        Q(last_name__icontains=search_query) |
+        Q(email__icontains=search_query)
+    )
+
+
+def patient_search_filter(search_query):
+    """Filtre de recherche des patients (prénom, nom, email) via l'index, sans limite de résultats."""
+    subquery = search_subquery(search_query)
+    return icontains_filter(search_query) if subquery is None else Q(pk__in=subquery)
+
+
+def search_patients(queryset, search_query):
+    """Filtre le queryset et le trie par pertinence (meilleur résultat en premier)."""
+    ids = search_patient_ids(search_query)
+    if ids is None:
+        return queryset.filter(icontains_filter(search_query))
+    ranking = Case(
+        *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(ranking) if ids else queryset.none()
@@ -0,0 +1,137 @@
+from importlib import import_module
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from users.models import UserSession
+from .cube import schedule_rebuild
+from .energy import invalidate_energy_requirements
+from .exports import EXPORT_KINDS
+from .middleware import PROFILE_COMPLETE_SESSION_KEY
+from .models import Consultation, ExportJob, PatientProfile
+from .search import index_patient, unindex_patient
+from .stats import invalidate_patient_counters, profile_stats_values, stored_stats_values, update_stats
+from .timeseries import invalidate_timeseries
+
+
+# --- Invalidation du marqueur "profil complet" des sessions du patient ---
+@receiver(post_save, sender=PatientProfile)
+def invalidate_profile_complete_marker(sender, instance, **kwargs):
+    SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+
+    # On passe par l'index des sessions : pas de parcours de django_session
+    session_keys = UserSession.objects.filter(user_id=instance.user_id).values_list('session_id', flat=True)
+    for session_key in session_keys:
+        session = SessionStore(session_key=session_key)
+        if session.pop(PROFILE_COMPLETE_SESSION_KEY, None) is not None:
+            session.save()
+
+
+# --- Péremption des exports mis en cache quand les données changent ---
+# Seuls les jobs dont le jeu de données contient la ligne modifiée sont périmés :
+# - profil modifié : jobs qui contiennent ce patient (`covers`) ;
+# - compte patient modifié ou supprimé : nom, email ou rôle peuvent faire entrer
+#   ou sortir le patient d'un export filtré, on périme donc tous les jobs du type ;
+# - compte non patient (diététicienne, admin) : jamais exporté, aucun effet.
+def expire_exports(sender, instance=None, **kwargs):
+    # La mise à jour de last_login à chaque connexion ne touche pas aux exports
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+
+    label = sender._meta.label
+    kinds = [kind for kind, exporter in EXPORT_KINDS.items() if label in exporter['depends_on']]
+    if not kinds:
+        return
+    jobs = ExportJob.objects.filter(kind__in=kinds, status__in=['running', 'done'])
+
+    # 1. Compte utilisateur : tout le type si le compte est (ou était) un patient.
+    # Rôle précédent lu au chargement (CustomUser.from_db), sans requête ; inconnu
+    # (rôle non chargé) : on périme par prudence
+    if sender is not PatientProfile:
+        previous = None if kwargs.get('created') else getattr(instance, '_loaded_role', 'patient')
+        if 'patient' in (instance.role, previous):
+            jobs.update(status='expired')
+        return
+
+    # 2. Profil : uniquement les exports qui contiennent ce patient
+    expired = [
+        job.pk for job in jobs.only('pk', 'kind', 'params')
+        if EXPORT_KINDS[job.kind]['covers'](job.params, instance.user_id)
+    ]
+    if expired:
+        ExportJob.objects.filter(pk__in=expired).update(status='expired')
+
+
+for model in (settings.AUTH_USER_MODEL, PatientProfile):
+    post_save.connect(expire_exports, sender=model)
+    post_delete.connect(expire_exports, sender=model)
+
+
+# --- Cumul des statistiques du tableau de bord (mise à jour incrémentale) ---
+@receiver(pre_save, sender=PatientProfile)
+def remember_profile_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Valeurs avant modification, pour pouvoir les retirer du cumul
+    instance._stats_previous = stored_stats_values(instance)
+
+
+@receiver(post_save, sender=PatientProfile)
+def add_profile_stats(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_stats(old=getattr(instance, '_stats_previous', None), new=profile_stats_values(instance))
+
+
+@receiver(post_delete, sender=PatientProfile)
+def remove_profile_stats(sender, instance, **kwargs):
+    update_stats(old=profile_stats_values(instance))
+
+
+# --- Reconstruction du cube statistique en arrière-plan ---
+@receiver([post_save, post_delete], sender=PatientProfile)
+@receiver([post_save, post_delete], sender=Consultation)
+def rebuild_stats_cube(sender, **kwargs):
+    # Après validation de la transaction, pour que le thread voie les nouvelles données
+    transaction.on_commit(schedule_rebuild)
+
+
+# --- Invalidation des compteurs de la liste des patients ---
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_patient_list_counters(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    # Un changement de rôle (patient -> diététicienne) modifie aussi les compteurs
+    invalidate_patient_counters()
+
+
+# --- Index de recherche des patients ---
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_patient_search(sender, instance, raw=False, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if raw or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    index_patient(instance)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def unindex_patient_search(sender, instance, **kwargs):
+    unindex_patient(instance.pk)
+
+
+# --- ETag des séries du graphique ---
+@receiver([post_save, post_delete], sender=Consultation)
+def invalidate_patient_timeseries(sender, instance, **kwargs):
+    invalidate_timeseries(instance.patient_id)
+
+
+# --- Besoins énergétiques de la patientèle (profils, changement de rôle) ---
+@receiver([post_save, post_delete], sender=PatientProfile)
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidate_energy_cache(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_energy_requirements()
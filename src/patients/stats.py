@@ -0,0 +1,162 @@
+import hashlib
+import time
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q, Sum
+from .models import PatientProfile, PatientStatsRollup
+from .search import patient_search_filter, trigram_threshold
+
+# Colonnes du profil utiles au cumul
+STATS_FIELDS = list(PatientStatsRollup.COUNT_FIELDS) + PatientStatsRollup.AVG_FIELDS
+
+
+def profile_stats_values(profile):
+    return {field: getattr(profile, field) for field in STATS_FIELDS}
+
+
+def lock_stats():
+    """
+    Verrouille la ligne de cumul jusqu'à la fin de la transaction.
+    Si elle n'existe pas encore, elle est construite depuis PatientProfile et
+    None est renvoyé : l'état actuel des profils y est alors déjà compté.
+    """
+    rollup = PatientStatsRollup.objects.select_for_update().filter(pk=1).first()
+    if rollup is None:
+        if create_stats():
+            return None
+        # Construite entre-temps par une autre transaction : le delta s'y applique
+        rollup = PatientStatsRollup.objects.select_for_update().get(pk=1)
+    return rollup
+
+
+def create_stats():
+    """
+    Insère la ligne de cumul construite depuis PatientProfile.
+    False si une autre transaction l'a insérée la première (clé primaire unique).
+    """
+    try:
+        with transaction.atomic():
+            rebuild_stats(force_insert=True)
+    except IntegrityError:
+        return False
+    return True
+
+
+def stored_stats_values(profile):
+    """
+    Valeurs actuellement en base (avant modification), ou None pour une création.
+    Le profil est relu sous verrou de ligne ; le cumul n'est verrouillé que si
+    une valeur de STATS_FIELDS change. PatientProfile.save() tient la
+    transaction jusqu'à update_stats() : les modifications concurrentes du
+    cumul sont sérialisées, les autres enregistrements ne s'attendent pas.
+    """
+    if profile._state.adding:
+        lock_stats()
+        return None
+    old = PatientProfile.objects.select_for_update().filter(pk=profile.pk).values(*STATS_FIELDS).first()
+    if old != profile_stats_values(profile):
+        lock_stats()
+    return old
+
+
+def update_stats(old=None, new=None):
+    """Applique le delta ancien -> nouveau sur la ligne de cumul, sous verrou."""
+    if old == new:
+        return
+    with transaction.atomic():
+        rollup = lock_stats()
+        if rollup is None:
+            return
+        if old is not None:
+            rollup.apply(old, -1)
+        if new is not None:
+            rollup.apply(new, 1)
+        rollup.save()
+
+
+def compute_live_stats():
+    """Recalcule les statistiques directement depuis PatientProfile (non enregistrées)."""
+    rollup = PatientStatsRollup(pk=1)
+    profiles = PatientProfile.objects.all()
+    rollup.patient_count = profiles.count()
+
+    for field, attr in PatientStatsRollup.COUNT_FIELDS.items():
+        rows = profiles.values(field).annotate(total=Count('pk')).order_by()
+        setattr(rollup, attr, {str(row[field]): row['total'] for row in rows})
+
+    aggregates = {}
+    for field in PatientStatsRollup.AVG_FIELDS:
+        aggregates[f'{field}_sum'] = Sum(field)
+        aggregates[f'{field}_n'] = Count(field)
+    for key, value in profiles.aggregate(**aggregates).items():
+        setattr(rollup, key, value or 0)
+    return rollup
+
+
+def rebuild_stats(force_insert=False):
+    with transaction.atomic():
+        rollup = compute_live_stats()
+        rollup.save(force_insert=force_insert)
+    return rollup
+
+
+def load_stats():
+    """Lecture par clé primaire ; construit la ligne si elle n'existe pas encore."""
+    rollup = PatientStatsRollup.objects.filter(pk=1).first()
+    if rollup is None:
+        create_stats()
+        rollup = PatientStatsRollup.objects.get(pk=1)
+    return rollup
+
+
+def diff_stats(stored, live, tolerance=1e-6):
+    """Liste des écarts entre le cumul enregistré et un recalcul complet."""
+    differences = []
+    attrs = ['patient_count'] + list(PatientStatsRollup.COUNT_FIELDS.values())
+    for field in PatientStatsRollup.AVG_FIELDS:
+        attrs += [f'{field}_sum', f'{field}_n']
+    for attr in attrs:
+        a, b = getattr(stored, attr), getattr(live, attr)
+        if isinstance(a, float) or isinstance(b, float):
+            same = abs(a - b) <= tolerance * max(1.0, abs(b))
+        else:
+            same = a == b
+        if not same:
+            differences.append((attr, a, b))
+    return differences
+
+
+# -----------------------------
+# Compteurs de la liste des patients (cache par terme de recherche)
+# -----------------------------
+PATIENT_COUNTERS_VERSION_KEY = 'patient_counters:version'
+PATIENT_COUNTERS_TIMEOUT = 60 * 15
+
+
+def patient_counters(search_query=None):
+    """
+    Total / actifs / inactifs / correspondant à la recherche, en une seule
+    requête d'agrégation conditionnelle, mis en cache par terme de recherche.
+    """
+    version = caches[settings.PERSISTENT_CACHE_ALIAS].get_or_set(PATIENT_COUNTERS_VERSION_KEY, time.time_ns, None)
+    term = hashlib.sha256((search_query or '').encode()).hexdigest()
+    key = f'patient_counters:{version}:{term}'
+
+    counters = cache.get(key)
+    if counters is None:
+        with trigram_threshold():
+            counters = get_user_model().objects.filter(role='patient').aggregate(
+                total_patients=Count('pk'),
+                active_patients=Count('pk', filter=Q(is_active=True)),
+                inactive_patients=Count('pk', filter=Q(is_active=False)),
+                matching_patients=Count('pk', filter=patient_search_filter(search_query)) if search_query else Count('pk'),
+            )
+        cache.set(key, counters, PATIENT_COUNTERS_TIMEOUT)
+    return counters
+
+
+def invalidate_patient_counters():
+    # Nouvelle version : les anciennes entrées ne sont plus jamais lues (et expirent)
+    caches[settings.PERSISTENT_CACHE_ALIAS].set(PATIENT_COUNTERS_VERSION_KEY, time.time_ns(), None)
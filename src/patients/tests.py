@@ -1,3 +1,285 @@
-from django.test import TestCase
+import datetime
+import math
+from unittest import mock
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from users.models import CustomUser
+from .diary import SYNC_SAFETY_MARGIN, food_diary_changes
+from .mealplans import UPSERT_BATCH_SIZE, assign_template
+from .models import (
+    Consultation, ExportJob, FoodDiary, FoodDiaryTombstone, MealPlan, MealPlanTemplate, MealPlanTemplateDay,
+    PatientProfile, PatientStatsRollup,
+)
+from .pagination import CursorPaginator
+from .planner import DAYS, PLAN_TIMEOUT, SLOTS, excluded_tags, generate_plans, load_catalogue, optimize_week
+from .stats import compute_live_stats, create_stats, diff_stats, load_stats
 
-# Create your tests here.
+
+# -----------------------------
+# Plans d'exécution des requêtes fréquentes
+# Chaque requête "par patient, triée par date" doit passer par un index :
+# ni parcours complet de table, ni tri dans un B-tree temporaire.
+# -----------------------------
+class QueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dietitian = CustomUser.objects.create(email='dietitian@example.com', role='dietitian')
+        cls.patient = CustomUser.objects.create(email='patient@example.com', role='patient')
+        for i in range(5):
+            Consultation.objects.create(
+                patient=cls.patient, dietitian=cls.dietitian, weight=70 + i,
+                nutritional_diagnosis='-', goals='-', intervention_plan='-',
+                next_appointment=datetime.date.today() + datetime.timedelta(days=i),
+            )
+            FoodDiary.objects.create(patient=cls.patient, meal_time='lunch', description='-')
+        MealPlan.objects.create(patient=cls.patient, day='1', breakfast='-', lunch='-', dinner='-')
+        FoodDiaryTombstone.objects.create(patient=cls.patient, entry_id=FoodDiary.objects.first().id)
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Sur de petites tables le planificateur préfère un Seq Scan : on le désactive pour juger l'index
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+        elif connection.vendor != 'sqlite':
+            self.skipTest("Vérification des plans écrite pour SQLite et PostgreSQL.")
+
+    def assertUsesIndex(self, queryset):
+        """Requête filtrée servie par une recherche dans un index (pas un parcours, même d'index)."""
+        plan = queryset.explain()
+        if connection.vendor == 'sqlite':
+            # "SCAN" = parcours complet (de la table ou de tout un index : "SCAN t USING INDEX") ;
+            # "USE TEMP B-TREE" = tri en mémoire ; seul "SEARCH ... USING INDEX" lit une plage
+            lines = plan.splitlines()
+            searched = any('SEARCH ' in line and 'USING' in line for line in lines)
+            if not searched or any('SCAN ' in line or 'USE TEMP B-TREE' in line for line in lines):
+                self.fail(f"Plan sans recherche par index pour :\n{queryset.query}\n{plan}")
+        else:
+            # "Index Cond" : l'index est interrogé avec le filtre, pas seulement parcouru dans l'ordre
+            if 'Seq Scan' in plan or 'Sort' in plan or 'Index Cond' not in plan:
+                self.fail(f"Plan sans recherche par index pour :\n{queryset.query}\n{plan}")
+
+    def cursor_queryset(self, queryset, ordering):
+        # Requête d'une page "suivante" telle que générée par CursorPaginator
+        paginator = CursorPaginator(queryset, 10, ordering)
+        values = [getattr(queryset.first(), field.lstrip('-')) for field in ordering]
+        return queryset.filter(paginator._after(values, False)).order_by(*ordering)[:11]
+
+    def test_consultation_history(self):
+        consultations = self.patient.consultations.all()
+        self.assertUsesIndex(consultations.order_by('-date_consultation', '-id')[:11])
+        self.assertUsesIndex(self.cursor_queryset(consultations, ('-date_consultation', '-id')))
+
+    def test_consultation_timeseries(self):
+        self.assertUsesIndex(
+            self.patient.consultations.order_by('date_consultation', 'id').values_list('date_consultation', 'weight')
+        )
+
+    def test_food_diary(self):
+        entries = self.patient.food_entries.all()
+        self.assertUsesIndex(entries.order_by('-date', '-created_at', '-id')[:11])
+        self.assertUsesIndex(self.cursor_queryset(entries, ('-date', '-created_at', '-id')))
+
+    def test_meal_plan(self):
+        self.assertUsesIndex(MealPlan.objects.filter(patient=self.patient).order_by('day'))
+
+    def test_upcoming_appointments(self):
+        self.assertUsesIndex(
+            Consultation.objects.filter(next_appointment__gte=datetime.date.today()).order_by('next_appointment')
+        )
+
+    def test_patient_list(self):
+        patients = CustomUser.objects.filter(role='patient')
+        self.assertUsesIndex(patients.order_by('-date_joined', '-id')[:11])
+        self.assertUsesIndex(self.cursor_queryset(patients, ('-date_joined', '-id')))
+
+    def test_food_diary_sync(self):
+        entries = self.patient.food_entries.all()
+        self.assertUsesIndex(entries.order_by('updated_at', 'id')[:201])
+        self.assertUsesIndex(self.cursor_queryset(entries, ('updated_at', 'id')))
+        self.assertUsesIndex(self.cursor_queryset(self.patient.food_tombstones.all(), ('deleted_at', 'id')))
+
+
+class FoodDiarySyncTests(TestCase):
+
+    def test_late_commit_is_read_again(self):
+        patient = CustomUser.objects.create(email='patient@example.com', role='patient')
+        FoodDiary.objects.create(patient=patient, meal_time='Midi', description='Salade')
+        first = food_diary_changes(patient)
+        self.assertEqual(len(first['changed']), 1)
+        self.assertFalse(first['more'])
+
+        # Ligne horodatée avant la dernière vue, validée après la synchronisation
+        late = FoodDiary.objects.create(patient=patient, meal_time='Soir', description='Soupe')
+        FoodDiary.objects.filter(pk=late.pk).update(updated_at=late.updated_at - SYNC_SAFETY_MARGIN / 2)
+        second = food_diary_changes(patient, first['next'])
+        self.assertIn(str(late.pk), [row[0] for row in second['changed']])
+
+        # Au-delà de la marge, plus rien n'est relu
+        FoodDiary.objects.update(updated_at=late.updated_at - SYNC_SAFETY_MARGIN * 2)
+        third = food_diary_changes(patient)
+        self.assertEqual(food_diary_changes(patient, third['next'])['changed'], [])
+
+
+class ExportExpiryTests(TestCase):
+
+    def setUp(self):
+        self.job = ExportJob.objects.create(kind='patients_xlsx', cache_key='-', status='done')
+
+    def test_role_change_expires_without_extra_query(self):
+        dietitian = CustomUser.objects.create(email='dietitian@example.com', role='dietitian')
+        user = CustomUser.objects.get(pk=dietitian.pk)
+        user.first_name = 'Anne'
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        # Rôle précédent connu depuis le chargement : aucune relecture du compte
+        self.assertFalse([q['sql'] for q in queries if q['sql'].startswith('SELECT')])
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'done')
+
+        patient = CustomUser.objects.create(email='patient@example.com', role='patient')
+        ExportJob.objects.update(status='done')
+        user = CustomUser.objects.get(pk=patient.pk)
+        user.role = 'dietitian'
+        user.save()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'expired')
+
+
+class StatsRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            CustomUser.objects.create(email=f'patient{i}@example.com', role='patient')
+
+    def test_first_write_builds_rollup_from_profiles(self):
+        PatientStatsRollup.objects.all().delete()
+        profile = PatientProfile.objects.first()
+        profile.age = 42
+        profile.save()
+        stats = load_stats()
+        self.assertEqual(stats.patient_count, 3)
+        self.assertEqual(diff_stats(stats, compute_live_stats()), [])
+
+    def test_incremental_updates_match_live_stats(self):
+        profile = PatientProfile.objects.first()
+        profile.weight, profile.height = 80, 180
+        profile.save()
+        PatientProfile.objects.last().delete()
+        self.assertEqual(diff_stats(load_stats(), compute_live_stats()), [])
+
+    def test_save_without_stats_change_leaves_rollup_alone(self):
+        load_stats()
+        profile = PatientProfile.objects.first()
+        profile.medications = 'Metformine'
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+        rollup_table = PatientStatsRollup._meta.db_table
+        self.assertFalse([q['sql'] for q in queries if rollup_table in q['sql']])
+
+    def test_concurrent_first_write_reuses_row(self):
+        # Ligne insérée par une autre transaction entre la lecture et l'insertion
+        PatientStatsRollup.objects.all().delete()
+        self.assertTrue(create_stats())
+        self.assertFalse(create_stats())
+        self.assertEqual(PatientStatsRollup.objects.count(), 1)
+
+
+class PlannerTests(SimpleTestCase):
+
+    def test_excluded_tags(self):
+        self.assertEqual(excluded_tags(False, "Diabète de type 2, HTA"), ['sel', 'sucre'])
+        self.assertEqual(excluded_tags(False, "Végétarien"), ['fruits_de_mer', 'poisson', 'porc', 'viande'])
+        # Allergie sans précision : allergènes les plus graves écartés
+        self.assertEqual(excluded_tags(True, ""), ['arachide', 'fruits_de_mer'])
+        self.assertEqual(excluded_tags(True, "Allergie au gluten"), ['gluten'])
+
+    def test_week_respects_exclusions(self):
+        excluded = excluded_tags(True, "Diabète, végétarien, intolérance au lactose")
+        plan = optimize_week(1800, excluded, time_budget=0.2, seed=1)
+
+        self.assertEqual(len(plan), DAYS)
+        tags = {name: dish_tags for name, _kind, dish_tags, _values in load_catalogue()}
+        for day in plan:
+            self.assertEqual(list(day), SLOTS)
+            for name, _values in day.values():
+                self.assertFalse(tags[name] & set(excluded), name)
+
+    def test_timeout_is_distinct_from_no_plan(self):
+        # Délai écoulé avant la fin du calcul : à réessayer, pas "aucun plan compatible"
+        with mock.patch('patients.planner.STARTUP_GRACE', -60):
+            plans = generate_plans({'a': (1800, [], 1)}, time_budget=0.1, workers=1)
+        self.assertIs(plans['a'], PLAN_TIMEOUT)
+
+
+class MealPlanTemplateTests(TestCase):
+    PATIENTS = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.bulk_create([
+            CustomUser(email=f'patient{i}@example.com', role='patient') for i in range(cls.PATIENTS)
+        ])
+        cls.patient_ids = list(CustomUser.objects.filter(role='patient').values_list('pk', flat=True))
+        cls.week = cls.make_template('Semaine', 7)
+
+    @classmethod
+    def make_template(cls, name, days):
+        template = MealPlanTemplate.objects.create(name=name)
+        MealPlanTemplateDay.objects.bulk_create([
+            MealPlanTemplateDay(template=template, day=str(day), breakfast=f'{name} {day}', lunch='-', dinner='-')
+            for day in range(1, days + 1)
+        ])
+        return template
+
+    def test_assign_to_many_patients_in_batches(self):
+        rows = self.PATIENTS * 7
+        batch_size = min(UPSERT_BATCH_SIZE, connection.ops.bulk_batch_size(MealPlan._meta.concrete_fields, [None] * rows))
+        # Journées du modèle + savepoint + un INSERT ... ON CONFLICT par lot, quel que soit le nombre de patients
+        with self.assertNumQueries(3 + math.ceil(rows / batch_size)):
+            self.assertEqual(assign_template(self.week, self.patient_ids), rows)
+        self.assertEqual(MealPlan.objects.count(), rows)
+
+        # Seconde attribution : mise à jour en place, pas de doublon (patient, jour)
+        assign_template(self.make_template('Autre', 7), self.patient_ids)
+        self.assertEqual(MealPlan.objects.count(), rows)
+        self.assertFalse(MealPlan.objects.exclude(breakfast__startswith='Autre').exists())
+
+    def test_replace_removes_days_missing_from_template(self):
+        patient, other = self.patient_ids[:2]
+        assign_template(self.week, [patient, other])
+        short = self.make_template('Court', 3)
+
+        assign_template(short, [patient])
+        self.assertEqual(MealPlan.objects.filter(patient_id=patient).count(), 7)
+
+        assign_template(short, [patient], replace=True)
+        plans = MealPlan.objects.filter(patient_id=patient)
+        self.assertEqual(list(plans.values_list('day', flat=True)), ['1', '2', '3'])
+        self.assertFalse(plans.exclude(breakfast__startswith='Court').exists())
+        # Les autres patients ne sont pas touchés
+        self.assertEqual(MealPlan.objects.filter(patient_id=other).count(), 7)
+
+    def test_meal_plan_form_updates_existing_days(self):
+        patient = self.patient_ids[0]
+        assign_template(self.make_template('Court', 2), [patient])
+        plans = list(MealPlan.objects.filter(patient_id=patient))
+        dietitian = CustomUser.objects.create(email='dietitian@example.com', role='dietitian')
+        PatientProfile.objects.filter(user=dietitian).update(age=40)
+        self.client.force_login(dietitian)
+
+        data = {'form-TOTAL_FORMS': 3, 'form-INITIAL_FORMS': 2, 'form-MIN_NUM_FORMS': 0, 'form-MAX_NUM_FORMS': 7}
+        for i, plan in enumerate(plans):
+            # Jour modifié dans la requête : ignoré, la journée existante garde le sien
+            data.update({f'form-{i}-id': plan.pk, f'form-{i}-day': '7', f'form-{i}-breakfast': f'Modifié {i}'})
+        data.update({'form-2-day': '3', 'form-2-breakfast': 'Nouveau'})
+        for i in range(3):
+            data.update({f'form-{i}-lunch': '-', f'form-{i}-dinner': '-'})
+        response = self.client.post(reverse('manage_meal_plan', args=[patient]), data)
+
+        self.assertEqual(response.status_code, 302)
+        stored = dict(MealPlan.objects.filter(patient_id=patient).values_list('day', 'breakfast'))
+        self.assertEqual(stored, {'1': 'Modifié 0', '2': 'Modifié 1', '3': 'Nouveau'})
@@ -0,0 +1,12 @@
+import unicodedata
+
+# -----------------------------
+# Normalisation des textes saisis (recherche, catalogue, antécédents)
+# Sans Django : aussi importé par les processus du générateur de plans (planner.py).
+# -----------------------------
+
+
+def normalize(text):
+    """Minuscules et sans accents : 'Hélène' -> 'helene'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
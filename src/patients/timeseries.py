@@ -0,0 +1,112 @@
+import hashlib
+import time
+from datetime import date
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+
+# -----------------------------
+# Séries temporelles des consultations (graphiques du dossier médical)
+# Le serveur ne renvoie que les points que le graphique peut afficher :
+# sous-échantillonnage LTTB (Largest-Triangle-Three-Buckets), qui garde
+# les pics et les creux de la courbe au lieu d'en prendre un sur n.
+# -----------------------------
+SERIES = {
+    'weight': {'label': _("Poids (kg)"), 'field': 'weight'},
+    'bmi': {'label': _("IMC"), 'field': 'bmi'},
+    'ldl': {'label': _("LDL"), 'field': 'ldl'},
+    'hdl': {'label': _("HDL"), 'field': 'hdl'},
+    'hba1c': {'label': _("HbA1c (%)"), 'field': 'hba1c'},
+    'triglycerides': {'label': _("Triglycérides"), 'field': 'triglycerides'},
+}
+
+DEFAULT_POINTS = 200
+MAX_POINTS = 2000
+TIMESERIES_VERSION_KEY = 'timeseries:version:{patient_id}'
+
+
+def lttb(points, threshold):
+    """
+    Réduit une liste de points (x, y) triés par x à `threshold` points en
+    gardant la forme de la courbe : dans chaque intervalle, on garde le point
+    qui forme le plus grand triangle avec le point retenu précédemment et la
+    moyenne de l'intervalle suivant. Le premier et le dernier point sont conservés.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0  # Indice du dernier point retenu
+    for i in range(threshold - 2):
+        # Moyenne de l'intervalle suivant (le dernier point pour le dernier intervalle)
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        span = points[next_start:next_end]
+        avg_x = sum(p[0] for p in span) / len(span)
+        avg_y = sum(p[1] for p in span) / len(span)
+
+        # Point de l'intervalle courant formant le plus grand triangle
+        ax, ay = points[a]
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, next_start):
+            x, y = points[j]
+            area = abs((ax - avg_x) * (y - ay) - (ax - x) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        a = best
+
+    sampled.append(points[-1])
+    return sampled
+
+
+def consultation_series(patient, metrics, start=None, end=None):
+    """Séries complètes {métrique: [(date, valeur), ...]} triées par date, valeurs nulles exclues."""
+    consultations = patient.consultations.all()
+    if start:
+        consultations = consultations.filter(date_consultation__gte=start)
+    if end:
+        consultations = consultations.filter(date_consultation__lte=end)
+
+    # Une seule requête, limitée aux colonnes utiles (l'IMC est stocké sur la consultation)
+    fields = [SERIES[metric]['field'] for metric in metrics]
+    rows = consultations.order_by('date_consultation', 'id').values_list('date_consultation', *fields)
+
+    series = {metric: [] for metric in metrics}
+    for day, *values in rows:
+        for metric, value in zip(metrics, values):
+            if value is not None:
+                series[metric].append((day, value))
+    return series
+
+
+def downsample(series, threshold):
+    # LTTB travaille sur des abscisses numériques : le jour (ordinal) de la consultation
+    points = [(day.toordinal(), value) for day, value in series]
+    return [(date.fromordinal(x), y) for x, y in lttb(points, threshold)]
+
+
+def patient_timeseries(patient, metrics, start=None, end=None, points=DEFAULT_POINTS):
+    series = consultation_series(patient, metrics, start, end)
+    return {
+        metric: {
+            'label': str(SERIES[metric]['label']),
+            'total': len(values),
+            'points': [[day.isoformat(), value] for day, value in downsample(values, points)],
+        }
+        for metric, values in series.items()
+    }
+
+
+# --- ETag : version des données du patient, changée par les signaux ---
+def timeseries_etag(patient_id, *params):
+    key = TIMESERIES_VERSION_KEY.format(patient_id=patient_id)
+    version = caches[settings.PERSISTENT_CACHE_ALIAS].get_or_set(key, time.time_ns, None)
+    key = '|'.join([str(patient_id), str(version)] + [str(p) for p in params])
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def invalidate_timeseries(patient_id):
+    caches[settings.PERSISTENT_CACHE_ALIAS].set(TIMESERIES_VERSION_KEY.format(patient_id=patient_id), time.time_ns(), None)
@@ -10,14 +10,27 @@ urlpatterns = [
     path('dietitian/dashboard/', views.DietitianPatientListView.as_view(), name='dietitian_dashboard'),
     path('dietitian/patient/<uuid:user_id>/details/modal/', views.dietitian_patient_profile_modal, name='dietitian_patient_profile_modal'),
     path('export/patients/excel/', views.export_patients_excel, name='export_patients_excel'),
+    path('export/<str:kind>/jobs/', views.export_job_create, name='export_job_create'),
+    path('export/jobs/<uuid:job_id>/', views.export_job_status, name='export_job_status'),
+    path('export/jobs/<uuid:job_id>/download/', views.export_job_download, name='export_job_download'),
+    path('research/export/<str:dataset>/', views.export_research_data, name='export_research_data'),
     path('dietitian/statistics/', views.dietitian_stats_view, name='dietitian_statistics'),
+    path('dietitian/statistics/cube/', views.dietitian_stats_cube, name='dietitian_stats_cube'),
     path('patient/<uuid:patient_id>/consultation/add/', views.create_consultation, name='create_consultation'),
     path('patient/<uuid:patient_id>/record/', views.patient_medical_record, name='patient_record'),
+    path('patient/<uuid:patient_id>/timeseries/', views.patient_timeseries_view, name='patient_timeseries'),
+    path('patient/<uuid:patient_id>/nutrition/', views.patient_nutrition_view, name='patient_nutrition'),
     path('my-diary/add/', views.add_food_entry, name='add_food_entry'),
+    path('my-diary/batch/', views.add_food_entries_batch, name='add_food_entries_batch'),
+    path('my-diary/sync/', views.food_diary_sync, name='food_diary_sync'),
     path('my-medical-file/', views.my_medical_record, name='my_medical_record'),
     path('edit-food/<uuid:entry_id>/', views.edit_food_entry, name='edit_food_entry'),
     path('delete-food/<uuid:entry_id>/', views.delete_food_entry, name='delete_food_entry'),
     path('edit-consultation/<uuid:consult_id>/', views.edit_consultation, name='edit_consultation'),
     path('delete-consultation/<uuid:consult_id>/', views.delete_consultation, name='delete_consultation'),
     path('patient/<uuid:patient_id>/meal-plan/', views.manage_meal_plan, name='manage_meal_plan'),
+    path('patient/<uuid:patient_id>/meal-plan/save-template/', views.save_meal_plan_template, name='save_meal_plan_template'),
+    path('dietitian/meal-plan-templates/', views.meal_plan_template_list, name='meal_plan_template_list'),
+    path('dietitian/meal-plan-templates/<uuid:template_id>/assign/', views.assign_meal_plan_template, name='assign_meal_plan_template'),
+    path('dietitian/meal-plan-templates/<uuid:template_id>/delete/', views.delete_meal_plan_template, name='delete_meal_plan_template'),
 ]
\ No newline at end of file
@@ -1,24 +1,40 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from .forms import PatientProfileForm, ConsultationForm, FoodDiaryForm
-from django.http import HttpResponse
+from django.http import HttpResponse, FileResponse, JsonResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import require_POST
 from django.utils.translation import gettext_lazy as _
-from django.core.paginator import Paginator
-import openpyxl, json
-from .models import PatientProfile, FoodDiary, Consultation, MealPlan
+from .pagination import CursorPaginator
+import json
+from .models import PatientProfile, FoodDiary, Consultation, MealPlan, MealPlanTemplate, ExportJob
 from django.views.generic import DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.contrib import messages
-from .forms import UserUpdateForm, PatientProfileUpdateForm
+from .forms import UserUpdateForm, PatientProfileUpdateForm, MealPlanTemplateForm, MealPlanTemplateAssignForm, BaseMealPlanFormSet
 from .models import PatientProfile
 from django.views.generic import ListView
 from django.contrib.auth import get_user_model
-from django.db.models import Q
 from django.db import transaction # Pour s'assurer que les deux sauvegardes sont atomiques
+from django.db.models import Count
 from users.models import CustomUser
-from django.db.models import Count, Avg
 from django.forms import modelformset_factory
+from .search import SEARCH_LIMIT, search_backend, search_patients
+from .stats import load_stats, patient_counters
+from .cube import DIMENSIONS, get_cube
+from .diary import MAX_BATCH_SIZE, MAX_SYNC_PAGE_SIZE, SYNC_PAGE_SIZE, food_diary_changes, ingest_food_entries, remove_food_entry
+from .energy import cohort_energy_requirements, energy_summary, patient_energy_requirements
+from .mealplans import assign_template, draft_meal_plans, save_meal_plans, template_from_patient
+from .planner import PLAN_TIMEOUT, plan_to_initial, plan_totals
+from .nutrition import attach_nutrients, patient_nutrition
+from .timeseries import DEFAULT_POINTS, MAX_POINTS, SERIES, patient_timeseries, timeseries_etag
+from django.utils.cache import get_conditional_response
+from .exports import (
+    EXPORT_JOB_TIMEOUT, EXPORT_KINDS, RESEARCH_DATASETS, RESEARCH_FORMATS, XLSX_CONTENT_TYPE, build_patients_xlsx,
+    export_cache_key, iter_research_export, patient_export_queryset, research_queryset,
+)
 
 
 User = get_user_model()
@@ -43,6 +59,10 @@ def is_dietitian_check(user):
     """Vérifie si l'utilisateur est authentifié et a le rôle 'dietitian'."""
     return user.is_authenticated and user.role == "dietitian"
 
+def can_view_record(user, patient_id):
+    """La diététicienne voit tous les dossiers, le patient uniquement le sien."""
+    return is_dietitian_check(user) or (user.is_authenticated and user.pk == patient_id)
+
 
 class DietitianPatientListView(LoginRequiredMixin, IsDietitianMixin, ListView):
     # Nous listons les objets User (car nous avons besoin du nom, de l'email, etc.)
@@ -52,26 +72,57 @@ class DietitianPatientListView(LoginRequiredMixin, IsDietitianMixin, ListView):
     paginate_by = 10 # Optionnel: pour la pagination
 
     def get_queryset(self):
-        queryset = User.objects.filter(role='patient').order_by('last_name').select_related('profile').order_by('-date_joined')
+        queryset = User.objects.filter(role='patient').select_related('profile').order_by('-date_joined')
         
         # Optionnel : Ajoutez ici la recherche si l'utilisateur entre un terme
         search_query = self.request.GET.get('q')
         if search_query:
-            queryset = queryset.filter(
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(email__icontains=search_query)
-            )
+            # Index de recherche : accents, préfixes et fautes de frappe, trié par pertinence
+            queryset = search_patients(queryset, search_query)
             
         return queryset
 
+    def get_counters(self):
+        # Tous les compteurs en une seule requête (mise en cache par terme de recherche)
+        if not hasattr(self, '_counters'):
+            self._counters = patient_counters(self.request.GET.get('q'))
+        return self._counters
+
+    def paginate_queryset(self, queryset, page_size):
+        # Hors recherche : pagination par curseur sur (date_joined, id), pas d'OFFSET.
+        # Avec recherche : le tri par pertinence garde la pagination par numéro de page.
+        if self.request.GET.get('q'):
+            return super().paginate_queryset(queryset, page_size)
+        paginator = CursorPaginator(queryset, page_size, ('-date_joined', '-id'))
+        page = paginator.get_page(self.request.GET.get('cursor'))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        paginator = super().get_paginator(queryset, per_page, orphans, allow_empty_first_page, **kwargs)
+        # Le paginateur réutilise le compteur déjà calculé au lieu de refaire un COUNT(*),
+        # borné comme la liste classée (SEARCH_LIMIT premiers résultats via l'index)
+        paginator.count = self.browsable_count()
+        return paginator
+
+    def browsable_count(self):
+        matching = self.get_counters()['matching_patients']
+        if self.request.GET.get('q') and search_backend():
+            return min(matching, SEARCH_LIMIT)
+        return matching
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        counters = self.get_counters()
         # Nombre total de patients (sans pagination)
-        context['total_patients'] = User.objects.filter(role='patient').count()
+        context['total_patients'] = counters['total_patients']
         # Optionnel : nombre actifs / inactifs
-        context['active_patients'] = User.objects.filter(role='patient', is_active=True).count()
-        context['inactive_patients'] = User.objects.filter(role='patient', is_active=False).count()
+        context['active_patients'] = counters['active_patients']
+        context['inactive_patients'] = counters['inactive_patients']
+        # Recherche tronquée : seuls les résultats les plus pertinents sont parcourables
+        if self.request.GET.get('q'):
+            context['matching_patients'] = counters['matching_patients']
+            context['search_limit'] = SEARCH_LIMIT
+            context['search_truncated'] = self.browsable_count() < counters['matching_patients']
         return context
 
 
@@ -206,112 +257,86 @@ def patient_profile_update_view(request):
 # Export sur fichier excel
 @login_required
 def export_patients_excel(request):
-    # 1. Création du fichier Excel
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Liste des Patients"
-
-    # 2. En-têtes basés sur tes modèles
-    headers = [
-        'Fist name', 'Last Name', 'Email', 'Nom d\'utilisateur', 'Rôle', 
-        'Âge', 'Genre', 'Profession', 'Niveau d\'activité', 
-        'Diagnostic', 'Taille (cm)', 'Poids (kg)', 'IMC (BMI)'
-    ]
-    ws.append(headers)
-
-    # 3. Récupération des données avec filtrage (identique à ta liste)
-    search_query = request.GET.get('q')
-    patients = User.objects.filter(role='patient').order_by('last_name')
-    
-    if search_query:
-        patients = patients.filter(
-            Q(first_name__icontains=search_query) | 
-            Q(last_name__icontains=search_query) | 
-            Q(email__icontains=search_query)
-        )
-
-    # 4. Remplissage des lignes
-    for patient in patients:
-        # On utilise le related_name='profile' que tu as défini dans ton modèle
-        profile = getattr(patient, 'profile', None) 
-        
-        row = [
-            patient.first_name,
-            patient.last_name,
-            patient.email,
-            patient.username,
-            patient.role,
-            profile.age if profile else "N/A",
-            profile.get_gender_display() if profile else "N/A", # Pour avoir 'Male' au lieu de 'M'
-            profile.occupation if profile else "N/A",
-            profile.get_activity_level_display() if profile else "N/A",
-            profile.diagnosis if profile else "N/A",
-            profile.height if profile else "N/A",
-            profile.weight if profile else "N/A",
-            profile.bmi if profile else "N/A",
-        ]
-        ws.append(row)
-
-    # 5. Configuration de la réponse HTTP pour le téléchargement
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    # 1. Récupération des données avec filtrage (identique à la liste), profil joint
+    patients = patient_export_queryset(request.GET.get('q'))
+
+    # 2. Génération en flux : feuille write_only + lecture par lots
+    output = build_patients_xlsx(patients)
+
+    # 3. Envoi par morceaux (FileResponse est une StreamingHttpResponse)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename='export_patients_complet.xlsx',
+        content_type=XLSX_CONTENT_TYPE,
     )
-    response['Content-Disposition'] = 'attachment; filename=export_patients_complet.xlsx'
-    wb.save(response)
-    
-    return response
 
 
 @login_required
 @user_passes_test(is_dietitian_check, login_url='/')
 def dietitian_stats_view(request):
+    # Une seule lecture par clé primaire : le cumul est tenu à jour par les signaux
+    stats = load_stats()
+
     # 1. Étude du Sexe
-    gender_stats = PatientProfile.objects.values('gender').annotate(total=Count('gender'))
-    
-    # 2. Étude des Allergies (Boolean)
-    allergy_stats = PatientProfile.objects.values('allergies').annotate(total=Count('allergies'))
-    
-    # 3. Étude du Niveau d'Activité
-    activity_stats = PatientProfile.objects.values('activity_level').annotate(total=Count('activity_level'))
-    
-    # 4. Top 5 des Professions (Occupation)
-    occupation_stats = PatientProfile.objects.values('occupation').annotate(total=Count('occupation')).order_by('-total')[:5]
-
-    # 5. Moyennes générales (Poids, Taille, Âge)
-    averages = PatientProfile.objects.aggregate(
-        avg_age=Avg('age'),
-        avg_weight=Avg('weight'),
-        avg_height=Avg('height'),
-        avg_bmi=Avg('bmi')
-    )
+    gender_stats = sorted(stats.gender_counts.items())
+
+    # 2. Étude du Niveau d'Activité
+    activity_stats = sorted(stats.activity_counts.items())
+    activity_choices = dict(PatientProfile.activity_level.field.choices)
+
+    # 3. Top 5 des Professions (Occupation)
+    occupation_stats = sorted(stats.occupation_counts.items(), key=lambda item: -item[1])[:5]
 
     context = {
         # CORRECTION : On force la conversion en string pour le JSON
-        'gender_labels': json.dumps([str(item['gender']) for item in gender_stats]),
-        'gender_data': json.dumps([item['total'] for item in gender_stats]),
+        'gender_labels': json.dumps([label for label, total in gender_stats]),
+        'gender_data': json.dumps([total for label, total in gender_stats]),
         
-        # CORRECTION : Ici aussi
+        # 4. Étude des Allergies (Boolean)
         'allergy_labels': json.dumps([str(_("Avec Allergies")), str(_("Sans Allergies"))]),
         'allergy_data': json.dumps([
-            next((item['total'] for item in allergy_stats if item['allergies']), 0),
-            next((item['total'] for item in allergy_stats if not item['allergies']), 0)
+            stats.allergy_counts.get('True', 0),
+            stats.allergy_counts.get('False', 0),
         ]),
 
         # CORRECTION : On s'assure que le choix de niveau d'activité est bien casté en string
-        'activity_labels': json.dumps([
-            str(dict(PatientProfile.activity_level.field.choices).get(item['activity_level'], item['activity_level'])) 
-            for item in activity_stats
-        ]),
-        'activity_data': json.dumps([item['total'] for item in activity_stats]),
+        'activity_labels': json.dumps([str(activity_choices.get(level, level)) for level, total in activity_stats]),
+        'activity_data': json.dumps([total for level, total in activity_stats]),
+
+        'occ_labels': json.dumps([occupation for occupation, total in occupation_stats if occupation]),
+        'occ_data': json.dumps([total for occupation, total in occupation_stats if occupation]),
 
-        'occ_labels': json.dumps([str(item['occupation']) for item in occupation_stats if item['occupation']]),
-        'occ_data': json.dumps([item['total'] for item in occupation_stats if item['occupation']]),
+        # 5. Moyennes générales (Poids, Taille, Âge)
+        'averages': stats.averages,
 
-        'averages': averages,
+        # 6. Besoins énergétiques moyens (Mifflin-St Jeor x activité)
+        'energy': energy_summary(cohort_energy_requirements()),
     }
     return render(request, 'dietitians/statistics.html', context)
 
 
+# Cube statistique : /dietitian/statistics/cube/?gender=Female&age_band=40-49&by=bmi_class
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+def dietitian_stats_cube(request):
+    cube = get_cube()
+    filters = {dimension: request.GET[dimension] for dimension in DIMENSIONS if request.GET.get(dimension)}
+    by = request.GET.get('by')
+    try:
+        result = cube.breakdown(by, **filters) if by else cube.query(**filters)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'filters': filters,
+        'by': by,
+        'result': result,
+        'dimensions': cube.values,
+        'built_at': cube.built_at,
+    })
+
+
 @login_required
 @user_passes_test(is_dietitian_check)
 def create_consultation(request, patient_id):
@@ -350,6 +375,35 @@ def add_food_entry(request):
     return render(request, 'patients/add_food.html', {'form': form})
 
 
+# Saisie groupée : POST JSON {"entries": [{"id": "<uuid client>", "date": "2025-01-31", "meal_time": "lunch", "description": "...", "beverage": false}, ...]}
+@login_required
+@require_POST
+def add_food_entries_batch(request):
+    if request.user.role != 'patient':
+        return JsonResponse({'error': _("Accès réservé aux patients.")}, status=403)
+    try:
+        rows = json.loads(request.body)['entries']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': _("Corps JSON invalide : clé 'entries' attendue.")}, status=400)
+    if not isinstance(rows, list) or len(rows) > MAX_BATCH_SIZE:
+        return JsonResponse({'error': _("Liste de %(max)s repas au maximum.") % {'max': MAX_BATCH_SIZE}}, status=400)
+
+    created, results = ingest_food_entries(request.user, rows)
+    return JsonResponse({'created': created, 'results': results})
+
+
+# Synchronisation hors ligne : /my-diary/sync/?since=<jeton>&limit=200 (rappeler tant que "more" est vrai)
+@login_required
+def food_diary_sync(request):
+    if request.user.role != 'patient':
+        return JsonResponse({'error': _("Accès réservé aux patients.")}, status=403)
+    try:
+        limit = min(max(int(request.GET.get('limit', SYNC_PAGE_SIZE)), 1), MAX_SYNC_PAGE_SIZE)
+    except ValueError:
+        limit = SYNC_PAGE_SIZE
+    return JsonResponse(food_diary_changes(request.user, request.GET.get('since', ''), limit))
+
+
 @login_required
 def edit_food_entry(request, entry_id):
     entry = get_object_or_404(FoodDiary, id=entry_id, patient=request.user)
@@ -364,41 +418,91 @@ def edit_food_entry(request, entry_id):
 @login_required
 def delete_food_entry(request, entry_id):
     entry = get_object_or_404(FoodDiary, id=entry_id, patient=request.user)
-    entry.delete()
+    remove_food_entry(entry) # Laisse une trace pour la synchronisation hors ligne
     messages.warning(request, "Le repas a été supprimé.")
     return redirect('my_medical_record')
 
 
+# Pagination par curseur (sans OFFSET ni COUNT) commune aux deux dossiers médicaux
+def paginate_medical_record(request, patient):
+    history = CursorPaginator(
+        patient.consultations.all(), 10, ('-date_consultation', '-id') # 10 par page
+    ).get_page(request.GET.get('cursor_h'))
+    food_log = CursorPaginator(
+        patient.food_entries.all(), 10, ('-date', '-created_at', '-id') # 10 par page
+    ).get_page(request.GET.get('cursor_f'))
+    return history, food_log
+
+
 @login_required
 @user_passes_test(is_dietitian_check)
 def patient_medical_record(request, patient_id):
     patient = get_object_or_404(User, id=patient_id, role='patient')
     
-    # 1. Données pour le GRAPHIQUE (non paginées)
-    chart_history = patient.consultations.all().order_by('date_consultation')
+    # 1. Le GRAPHIQUE charge ses points via patient_timeseries (JSON)
     meal_plans = MealPlan.objects.filter(patient=patient).order_by('day')
     
-    # 2. Pagination des CONSULTATIONS
-    all_history = patient.consultations.all().order_by('-date_consultation')
-    paginator_h = Paginator(all_history, 10) # 5 par page
-    page_h = request.GET.get('page_h')
-    history_paginated = paginator_h.get_page(page_h)
-    
-    # 3. Pagination du JOURNAL ALIMENTAIRE
-    all_food = patient.food_entries.all().order_by('-date')
-    paginator_f = Paginator(all_food, 10) # 10 par page
-    page_f = request.GET.get('page_f')
-    food_paginated = paginator_f.get_page(page_f)
+    # 2. et 3. Pagination par curseur des CONSULTATIONS et du JOURNAL ALIMENTAIRE
+    history_paginated, food_paginated = paginate_medical_record(request, patient)
+    attach_nutrients(food_paginated.object_list) # Apports estimés de chaque repas
     
     return render(request, 'dietitians/patient_record.html', {
         'patient': patient,
         'meal_plans': meal_plans,
-        'chart_history': chart_history, # Pour le canvas JS
         'history': history_paginated,   # Pour les cartes HTML
         'food_log': food_paginated      # Pour le tableau HTML
     })
 
 
+# Séries du graphique : /patient/<id>/timeseries/?metrics=weight,bmi&from=2024-01-01&to=2025-01-01&points=300
+@login_required
+def patient_timeseries_view(request, patient_id):
+    if not can_view_record(request.user, patient_id):
+        return JsonResponse({'error': _("Accès refusé.")}, status=403)
+
+    metrics = [m.strip() for m in request.GET.get('metrics', '').split(',') if m.strip()] or list(SERIES)
+    unknown = [m for m in metrics if m not in SERIES]
+    if unknown:
+        return JsonResponse({'error': _("Séries inconnues : %(series)s") % {'series': ', '.join(unknown)}}, status=400)
+    start = parse_date(request.GET.get('from', ''))
+    end = parse_date(request.GET.get('to', ''))
+    try:
+        points = min(max(int(request.GET.get('points', DEFAULT_POINTS)), 3), MAX_POINTS)
+    except ValueError:
+        points = DEFAULT_POINTS
+
+    # 1. Réponse conditionnelle : si rien n'a changé, 304 sans lire les consultations
+    etag = f'"{timeseries_etag(patient_id, request.LANGUAGE_CODE, ",".join(metrics), start, end, points)}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    # 2. Séries sous-échantillonnées côté serveur
+    patient = get_object_or_404(User, id=patient_id, role='patient')
+    response = JsonResponse({
+        'patient': str(patient.pk),
+        'from': start.isoformat() if start else None,
+        'to': end.isoformat() if end else None,
+        'series': patient_timeseries(patient, metrics, start, end, points),
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# Apports estimés du journal : /patient/<id>/nutrition/?from=2025-01-01&to=2025-01-31
+@login_required
+def patient_nutrition_view(request, patient_id):
+    if not can_view_record(request.user, patient_id):
+        return JsonResponse({'error': _("Accès refusé.")}, status=403)
+    patient = get_object_or_404(User, id=patient_id, role='patient')
+    return JsonResponse(patient_nutrition(
+        patient,
+        start=parse_date(request.GET.get('from', '')),
+        end=parse_date(request.GET.get('to', '')),
+    ))
+
+
 @login_required
 def edit_consultation(request, consult_id):
     consult = get_object_or_404(Consultation, id=consult_id)
@@ -430,26 +534,15 @@ def my_medical_record(request):
         messages.error(request, "Accès réservé aux patients.")
         return redirect('home')
     
-    # 1. Données pour le GRAPHIQUE (non paginées)
-    chart_history = patient.consultations.all().order_by('date_consultation')
+    # 1. Le GRAPHIQUE charge ses points via patient_timeseries (JSON)
     meal_plans = MealPlan.objects.filter(patient=patient).order_by('day')
     
-    # 2. Pagination des CONSULTATIONS
-    all_history = patient.consultations.all().order_by('-date_consultation')
-    paginator_h = Paginator(all_history, 10) # 10 par page
-    page_h = request.GET.get('page_h')
-    history_paginated = paginator_h.get_page(page_h)
-    
-    # 3. Pagination du JOURNAL ALIMENTAIRE
-    all_food = patient.food_entries.all().order_by('-date')
-    paginator_f = Paginator(all_food, 10) # 10 par page
-    page_f = request.GET.get('page_f')
-    food_paginated = paginator_f.get_page(page_f)
+    # 2. et 3. Pagination par curseur des CONSULTATIONS et du JOURNAL ALIMENTAIRE
+    history_paginated, food_paginated = paginate_medical_record(request, patient)
     
     return render(request, 'patients/my_record.html', {
         'patient': patient,
         'meal_plans': meal_plans,
-        'chart_history': chart_history, # Pour le canvas JS
         'history': history_paginated,   # Pour les cartes HTML
         'food_log': food_paginated,     # Pour le tableau HTML
         'food_form': FoodDiaryForm()
@@ -463,7 +556,8 @@ def manage_meal_plan(request, patient_id):
     
     # Définition du FormSet
     MealPlanFormSet = modelformset_factory(
-        MealPlan, 
+        MealPlan,
+        formset=BaseMealPlanFormSet, # Jour figé pour les journées existantes
         fields=('day', 'breakfast', 'morning_snack', 'lunch', 'afternoon_snack', 'dinner', 'evening_snack'),
         extra=0, # On met 0 car on va pré-générer ou filtrer les existants
         max_num=7
@@ -471,6 +565,7 @@ def manage_meal_plan(request, patient_id):
 
     # On récupère ce qui existe déjà pour ce patient
     queryset = MealPlan.objects.filter(patient=patient).order_by('day')
+    generated = None # Apports par jour du brouillon généré
 
     if request.method == 'POST':
         # On passe le queryset ici pour que Django sache quels IDs mettre à jour
@@ -479,20 +574,200 @@ def manage_meal_plan(request, patient_id):
             instances = formset.save(commit=False)
             for instance in instances:
                 instance.patient = patient
-                instance.save()
+            # Nouvelles journées : upsert sur patient + jour ; existantes : bulk_update
+            save_meal_plans(instances)
             messages.success(request, _("Plan alimentaire mis à jour avec succès !"))
             return redirect('patient_record', patient_id=patient.id)
     else:
+        # Brouillon généré (?generate=1) : pré-remplit le formset, rien n'est enregistré avant validation
+        draft = {}
+        if request.GET.get('generate'):
+            plan = draft_meal_plans([patient.pk]).get(patient.pk)
+            if plan is PLAN_TIMEOUT:
+                messages.warning(request, _("La génération du plan a pris trop de temps. Veuillez réessayer."))
+            elif plan is None:
+                messages.error(request, _("Impossible de générer un plan compatible avec ce profil."))
+            else:
+                draft = {row['day']: row for row in plan_to_initial(plan)}
+                generated = plan_totals(plan)
+
         # S'il n'y a rien en base, on peut soit laisser vide, 
         # soit forcer l'affichage de 7 formulaires vierges
         if not queryset.exists():
-            formset = MealPlanFormSet(queryset=MealPlan.objects.none())
+            formset = MealPlanFormSet(queryset=MealPlan.objects.none(), initial=list(draft.values()))
             # On force 7 formulaires vides si c'est la première fois
             formset.extra = 7 
         else:
-            formset = MealPlanFormSet(queryset=queryset)
+            # Jours absents du plan existant : formulaires supplémentaires pré-remplis
+            existing = {plan.day for plan in queryset}
+            missing = [row for day, row in sorted(draft.items()) if day not in existing]
+            formset = MealPlanFormSet(queryset=queryset, initial=missing)
+            formset.extra = len(missing)
+            for form in formset.forms:
+                if form.instance.day in draft:
+                    form.initial.update(draft[form.instance.day])
 
     return render(request, 'dietitians/manage_meal_plan.html', {
         'formset': formset,
-        'patient': patient
-    })
\ No newline at end of file
+        'patient': patient,
+        'energy': patient_energy_requirements(patient.pk), # Cibles caloriques du plan
+        'generated': generated,
+    })
+
+
+# -----------------------------
+# Modèles de plans alimentaires
+# -----------------------------
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+def meal_plan_template_list(request):
+    templates = MealPlanTemplate.objects.select_related('created_by').annotate(day_count=Count('days'))
+    return render(request, 'dietitians/meal_plan_templates.html', {'templates': templates})
+
+
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+@require_POST
+def save_meal_plan_template(request, patient_id):
+    # Le plan actuel du patient devient un modèle réutilisable
+    patient = get_object_or_404(User, id=patient_id, role='patient')
+    form = MealPlanTemplateForm(request.POST)
+    if not patient.meal_plans.exists():
+        messages.error(request, _("Ce patient n'a pas encore de plan alimentaire."))
+    elif form.is_valid():
+        template = template_from_patient(patient, created_by=request.user, **form.cleaned_data)
+        messages.success(request, _("Modèle « %(name)s » enregistré.") % {'name': template.name})
+        return redirect('meal_plan_template_list')
+    else:
+        messages.error(request, _("Le nom du modèle est obligatoire."))
+    return redirect('manage_meal_plan', patient_id=patient.id)
+
+
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+def assign_meal_plan_template(request, template_id):
+    template = get_object_or_404(MealPlanTemplate, id=template_id)
+    if request.method == 'POST':
+        form = MealPlanTemplateAssignForm(request.POST)
+        if form.is_valid():
+            patients = form.cleaned_data['patients']
+            # 1. Une transaction, un upsert par lot de journées (et non un save() par jour et par patient)
+            assign_template(template, [patient.pk for patient in patients], form.cleaned_data['replace'])
+            messages.success(request, _("Modèle « %(name)s » attribué à %(count)d patient(s).") % {
+                'name': template.name, 'count': len(patients),
+            })
+            return redirect('meal_plan_template_list')
+    else:
+        form = MealPlanTemplateAssignForm()
+
+    return render(request, 'dietitians/assign_meal_plan_template.html', {
+        'template': template,
+        'days': template.days.all(),
+        'form': form,
+    })
+
+
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+@require_POST
+def delete_meal_plan_template(request, template_id):
+    # Les plans déjà attribués sont des copies : ils ne sont pas touchés
+    get_object_or_404(MealPlanTemplate, id=template_id).delete()
+    messages.success(request, _("Modèle supprimé."))
+    return redirect('meal_plan_template_list')
+
+# -----------------------------
+# Exports en arrière-plan
+# -----------------------------
+def export_job_payload(job):
+    payload = {
+        'job_id': str(job.id),
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+    }
+    if job.status == 'done':
+        payload['download_url'] = reverse('export_job_download', args=[job.id])
+    if job.status == 'failed':
+        payload['error'] = job.error
+    return payload
+
+
+def render_export_job(request, job, status=200):
+    # HTMX : fragment qui se rafraîchit tout seul ; sinon JSON
+    if request.headers.get('HX-Request'):
+        return render(request, 'dietitians/partials/export_job_status.html', {'job': job}, status=status)
+    return JsonResponse(export_job_payload(job), status=status)
+
+
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+@require_POST
+def export_job_create(request, kind):
+    if kind not in EXPORT_KINDS:
+        raise Http404
+    # Même filtre de recherche que DietitianPatientListView
+    params = {'q': (request.POST.get('q') or request.GET.get('q') or '').strip()}
+    cache_key = export_cache_key(kind, params)
+
+    # 1. Job resté "pending"/"running" trop longtemps (worker arrêté) : en échec.
+    # Le worker ne termine que les jobs encore "running", un retardataire est donc ignoré.
+    ExportJob.objects.filter(
+        cache_key=cache_key, status__in=['pending', 'running'],
+        created_at__lt=timezone.now() - EXPORT_JOB_TIMEOUT,
+    ).update(status='failed', error="Délai dépassé : le worker d'export ne répond pas.", finished_at=timezone.now())
+
+    # 2. Export identique déjà prêt (ou en cours) : on le réutilise
+    job = ExportJob.objects.filter(cache_key=cache_key, status__in=['pending', 'running', 'done']).first()
+    if job:
+        return render_export_job(request, job)
+
+    # 3. Sinon on met en file d'attente pour le worker (run_export_worker)
+    job = ExportJob.objects.create(requested_by=request.user, kind=kind, params=params, cache_key=cache_key)
+    return render_export_job(request, job, status=202)
+
+
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+def export_job_status(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id)
+    return render_export_job(request, job)
+
+
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+def export_job_download(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, status='done')
+    exporter = EXPORT_KINDS[job.kind]
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=exporter['filename'],
+        content_type=exporter['content_type'],
+    )
+
+
+# Export recherche en flux : /research/export/consultations/?format=ndjson&fields=id,ldl,hdl&since=2025-01-01
+@login_required
+@user_passes_test(is_dietitian_check, login_url='/')
+def export_research_data(request, dataset):
+    if dataset not in RESEARCH_DATASETS:
+        raise Http404
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in RESEARCH_FORMATS:
+        return HttpResponse(_("Format non supporté."), status=400)
+
+    fields = [f.strip() for f in request.GET.get('fields', '').split(',') if f.strip()]
+    try:
+        fields, rows = research_queryset(
+            dataset,
+            fields=fields,
+            since=parse_date(request.GET.get('since', '')),
+            until=parse_date(request.GET.get('until', '')),
+        )
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+
+    response = StreamingHttpResponse(iter_research_export(fields, rows, fmt), content_type=RESEARCH_FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{fmt}"'
+    return response
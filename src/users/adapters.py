@@ -1,6 +1,5 @@
 from allauth.account.adapter import DefaultAccountAdapter
-from django.contrib.sessions.models import Session
-from django.utils import timezone
+from .sessions import revoke_user_sessions
 import logging
 
 logger = logging.getLogger(__name__)
@@ -8,23 +7,11 @@ logger = logging.getLogger(__name__)
 class MonAdaptateurCompte(DefaultAccountAdapter):
     
     def login(self, request, user):
-        # 1. On cherche les sessions actives en base de données
-        sessions = Session.objects.filter(expire_date__gte=timezone.now())
-        
-        count = 0
-        for session in sessions:
-            try:
-                data = session.get_decoded()
-                # On vérifie si l'ID de l'utilisateur correspond
-                if data.get('_auth_user_id') == str(user.pk):
-                    # On supprime l'ancienne session
-                    session.delete()
-                    count += 1
-            except Exception:
-                continue
+        # 1. On supprime les anciennes sessions de l'utilisateur (recherche indexée)
+        count = revoke_user_sessions(user, keep=request.session.session_key)
         
         if count > 0:
-            print(f"--- [SÉCURITÉ] {count} ancienne(s) session(s) supprimée(s) pour {user.username} ---")
+            logger.info("[SÉCURITÉ] %s ancienne(s) session(s) supprimée(s) pour %s", count, user.email)
         
         # 2. On appelle la méthode originale pour finaliser la connexion
-        return super().login(request, user)
\ No newline at end of file
+        return super().login(request, user)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        # Branche les signaux (profil patient, session unique)
+        from . import signals  # noqa: F401
@@ -0,0 +1,53 @@
+import zlib
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core import signing
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from users.models import UserSession
+
+
+class Command(BaseCommand):
+    help = "Remplit l'index UserSession à partir des sessions actives existantes (opération ponctuelle)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = {str(pk) for pk in get_user_model().objects.values_list('pk', flat=True)}
+
+        # Décodage direct (get_decoded() renverrait {} sans dire pourquoi) : sel et sérialiseur du moteur
+        store = Session.get_session_store_class()()
+
+        # 1. On parcourt les sessions actives par lots (un seul décodage par session)
+        sessions = Session.objects.filter(expire_date__gte=timezone.now(), owner__isnull=True)
+        batch, total, skipped = [], 0, 0
+        for session in sessions.iterator(chunk_size=batch_size):
+            try:
+                data = signing.loads(session.session_data, salt=store.key_salt, serializer=store.serializer)
+            except (signing.BadSignature, ValueError, zlib.error) as e:
+                # Signature invalide (SECRET_KEY changée) ou données illisibles : session ignorée
+                skipped += 1
+                if options['verbosity'] > 1:
+                    self.stderr.write(f"Session {session.session_key[:8]}… ignorée : {e.__class__.__name__}")
+                continue
+            user_id = data.get('_auth_user_id')
+            if user_id not in user_ids:
+                continue
+            batch.append(UserSession(session_id=session.session_key, user_id=user_id))
+
+            # 2. Insertion groupée
+            if len(batch) >= batch_size:
+                UserSession.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+                batch = []
+
+        if batch:
+            UserSession.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"{total} session(s) indexée(s)."))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"{skipped} session(s) illisible(s) ignorée(s) (-v 2 pour le détail)."))
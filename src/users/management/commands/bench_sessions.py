@@ -0,0 +1,75 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Compare la latence des requêtes authentifiées : sessions en base seule vs moteur cache (users.sessions)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--url', default='/')
+        parser.add_argument(
+            '--entries', type=int, default=0,
+            help="Entrées ajoutées au cache des sessions avant la mesure (taille réaliste : une par session active).",
+        )
+
+    def handle(self, *args, **options):
+        engines = [
+            ('base de données', 'django.contrib.sessions.backends.db'),
+            ('cache + base', 'users.sessions'),
+        ]
+
+        # Cache rempli comme en production : les écritures (purge comprise) en dépendent
+        session_cache = caches[settings.SESSION_CACHE_ALIAS]
+        filler = [f'bench-sessions:{i}' for i in range(options['entries'])]
+        for key in filler:
+            session_cache.set(key, {'_auth_user_id': '0'})
+
+        # Tout est annulé à la fin : l'utilisateur de test ne reste pas en base
+        try:
+            with transaction.atomic():
+                user = CustomUser(email='bench-sessions@example.com', role='dietitian')
+                user.set_unusable_password()
+                user.save()
+
+                for label, engine in engines:
+                    with override_settings(SESSION_ENGINE=engine, ALLOWED_HOSTS=['testserver']):
+                        reads, writes = self.run_engine(user, options['url'], options['requests'])
+                    for kind, timings in (('lecture', reads), ('écriture', writes)):
+                        self.stdout.write(
+                            f"{label:<16} {kind:<9} moyenne={statistics.mean(timings):.2f} ms  "
+                            f"médiane={statistics.median(timings):.2f} ms  "
+                            f"p95={statistics.quantiles(timings, n=20)[-1]:.2f} ms"
+                        )
+
+                transaction.set_rollback(True)
+        finally:
+            session_cache.delete_many(filler)
+
+    def run_engine(self, user, url, count):
+        client = Client()
+        client.force_login(user)
+        client.get(url)  # Préchauffage (chargement des middlewares, du cache)
+
+        reads = []
+        for _ in range(count):
+            start = time.perf_counter()
+            client.get(url)
+            reads.append((time.perf_counter() - start) * 1000)
+
+        # Écriture de session (connexion, panier...) : c'est là que le cache purge
+        session = client.session
+        writes = []
+        for i in range(count):
+            session['bench'] = i
+            start = time.perf_counter()
+            session.save()
+            writes.append((time.perf_counter() - start) * 1000)
+        return reads, writes
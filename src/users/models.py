@@ -23,5 +23,45 @@ class CustomUser(AbstractUser):
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["role"]
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Liste des patients triée par inscription (pagination par curseur du tableau de bord)
+            models.Index(fields=['role', '-date_joined', '-id'], name='user_role_joined_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        # Rôle tel que lu en base : un patient qui change de rôle sort des exports (patients.signals)
+        if 'role' in field_names:
+            user._loaded_role = user.role
+        return user
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._loaded_role = self.role
+
     def __str__(self):
         return f"{self.email} ({_(self.role)})"
+
+
+# -----------------------------
+# Index des sessions par utilisateur
+# -----------------------------
+class UserSession(models.Model):
+    """
+    Associe une session Django à son propriétaire.
+    Permet de retrouver (et révoquer) les sessions d'un utilisateur par une
+    simple recherche indexée, sans décoder toute la table django_session.
+    """
+    session = models.OneToOneField(
+        'sessions.Session',
+        on_delete=models.CASCADE,  # La ligne disparaît avec la session
+        primary_key=True,
+        related_name='owner'
+    )
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='user_sessions')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.user.email} - {self.session_id}"
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core.cache import caches
+from .models import UserSession
+
+
+class SessionStore(CachedDBStore):
+    """
+    Moteur de session "cache d'abord" : lecture dans le cache, écriture
+    dans le cache ET en base (durabilité). S'utilise via
+    SESSION_ENGINE = 'users.sessions'.
+    """
+
+    @classmethod
+    def revoke_user(cls, user, keep=None):
+        """
+        Révoque toutes les sessions d'un utilisateur (sauf `keep`) en passant
+        par l'index UserSession : aucune session n'est décodée.
+        Retourne le nombre de sessions supprimées.
+        """
+        sessions = cls.get_model_class().objects.filter(owner__user=user)
+        if keep:
+            sessions = sessions.exclude(session_key=keep)
+        keys = list(sessions.values_list('session_key', flat=True))
+        if not keys:
+            return 0
+
+        # 1. On vide le cache (sinon la session resterait valide jusqu'à expiration)
+        caches[settings.SESSION_CACHE_ALIAS].delete_many([cls.cache_key_prefix + key for key in keys])
+        # 2. Puis la base (la ligne d'index part en CASCADE)
+        cls.get_model_class().objects.filter(session_key__in=keys).delete()
+        return len(keys)
+
+
+def register_session(user, session_key):
+    """Enregistre la session courante comme appartenant à l'utilisateur."""
+    if not session_key:
+        return
+    UserSession.objects.update_or_create(session_id=session_key, defaults={'user': user})
+
+
+def revoke_user_sessions(user, keep=None):
+    """
+    Supprime toutes les sessions de l'utilisateur, sauf celle passée dans `keep`.
+    Fonctionne aussi avec le moteur base de données seul : le nettoyage du
+    cache est alors sans effet.
+    """
+    return SessionStore.revoke_user(user, keep=keep)
@@ -125,6 +125,53 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# Caches fichier : partagés entre les workers d'une même machine, sans service externe.
+# Indispensable pour que les invalidations (sessions révoquées, compteurs...) soient vues par tous les processus.
+# Chaque écriture liste le répertoire du cache pour décider d'une purge (1/CULL_FREQUENCY des
+# fichiers, au hasard) : le coût d'un set() croît avec MAX_ENTRIES, on garde donc des caches
+# petits. Mesure (bench_sessions --entries, SQLite et disque local) : écriture de session
+# ~4 ms avec 1 000 entrées, ~10 ms avec 3 000, ~48 ms avec 15 000 ; lecture ~3,4 ms dans
+# tous les cas.
+# Les clés sans expiration (marqueurs de version, statistiques du cache de fragments) ont
+# leur propre cache : une purge des fragments ou des sessions ne les supprime jamais.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 3000,    # Fragments, analyses nutritionnelles, compteurs (tous avec expiration)
+            'CULL_FREQUENCY': 3,
+        },
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'sessions'),
+        'OPTIONS': {
+            # Sessions récentes (la base reste la référence : une session purgée est relue en base)
+            'MAX_ENTRIES': 3000,
+            'CULL_FREQUENCY': 3,
+        },
+    },
+    'persistent': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'persistent'),
+        'OPTIONS': {
+            # Une clé par patient et par post, écrite seulement quand les données changent
+            # (le parcours du répertoire reste rare) : limite jamais atteinte, aucune purge
+            'MAX_ENTRIES': 1000000,
+        },
+    },
+}
+PERSISTENT_CACHE_ALIAS = 'persistent'
+
+# 🍪 Sessions : cache d'abord, écriture en base (voir users/sessions.py)
+SESSION_ENGINE = 'users.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 